@@ -1,80 +1,120 @@
+import re
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 
-def calculate_bill(patient):
+import numpy as np
+
+from diagnosis_taxonomy import diagnosis_category
+from tariffs import get_tariffs
+
+def calculate_bill(patient, now=None):
     """Calculate total bill for patient in Indian Rupees (INR)"""
-    
-    # Base costs in INR
-    room_cost_per_day = 2000  # ₹2,000 per day
-    doctor_consultation = 1500  # ₹1,500
-    nursing_care_per_day = 800  # ₹800 per day
+    now = now or datetime.utcnow()
     
     # Calculate days stayed
     admission_date = datetime.strptime(patient["admission_date"], "%Y-%m-%d")
-    days_stayed = max((datetime.utcnow() - admission_date).days, 1)  # Minimum 1 day
+    days_stayed = max((now - admission_date).days, 1)  # Minimum 1 day
 
+    # Ward and diagnosis-specific prices from the current tariff table
+    tariffs = get_tariffs()
+    tariff = tariffs.lookup(diagnosis_category(patient), patient.get("ward"))
+    
     # Base charges
-    room_charges = room_cost_per_day * days_stayed
-    doctor_charges = doctor_consultation
-    nursing_charges = nursing_care_per_day * days_stayed
-    prescription_cost = 1200  # Base prescription cost
+    room_charges = tariff.room_per_day * days_stayed
+    doctor_charges = tariff.doctor_consultation
+    nursing_charges = tariff.nursing_per_day * days_stayed
+    prescription_cost = tariff.prescription_cost
     
     # Diagnosis-specific additional charges
-    additional_cost = 0
-    diagnosis_lower = patient["diagnosis"].lower()
-    additional_items = []
-    
-    if "heart" in diagnosis_lower or "myocardial" in diagnosis_lower or "cardiac" in diagnosis_lower:
-        additional_cost = 15000  # Cardiac care package
-        additional_items.append("Cardiac Monitoring & ECG")
-        additional_items.append("Cardiology Consultation")
-        prescription_cost = 3500  # Cardiac medications are expensive
-        
-    elif "stroke" in diagnosis_lower:
-        additional_cost = 18000  # Stroke care
-        additional_items.append("CT/MRI Scan")
-        additional_items.append("Neurology Consultation")
-        additional_items.append("Physiotherapy Sessions")
-        prescription_cost = 4000
-        
-    elif "surgery" in diagnosis_lower or "fracture" in diagnosis_lower or "appendicitis" in diagnosis_lower:
-        additional_cost = 25000  # Surgical care
-        additional_items.append("Operation Theatre Charges")
-        additional_items.append("Anesthesia")
-        additional_items.append("Surgical Supplies")
-        prescription_cost = 2500
-        
-    elif "pneumonia" in diagnosis_lower or "copd" in diagnosis_lower or "asthma" in diagnosis_lower:
-        additional_cost = 8000  # Respiratory care
-        additional_items.append("Chest X-Ray")
-        additional_items.append("Oxygen Therapy")
-        additional_items.append("Nebulization")
-        prescription_cost = 2800
-        
-    elif "diabetes" in diagnosis_lower:
-        additional_cost = 5000  # Diabetes management
-        additional_items.append("Blood Sugar Monitoring")
-        additional_items.append("HbA1c Test")
-        additional_items.append("Diabetes Education")
-        prescription_cost = 3200
-        
-    else:
-        additional_cost = 3000  # General medical care
-        additional_items.append("Laboratory Tests")
-        additional_items.append("Medical Supplies")
+    additional_cost = tariff.package_cost
+    additional_items = list(tariff.items)
     
     # Calculate total
     total = (room_charges + doctor_charges + nursing_charges + 
              prescription_cost + additional_cost)
     
-    # Add 18% GST
-    gst_amount = total * 0.18
+    # Add GST
+    gst_amount = total * tariffs.gst_rate
     final_total = total + gst_amount
     
+    return _bill_document(patient, tariffs, now.strftime("%Y-%m-%d"), days_stayed, room_charges, doctor_charges,
+                          nursing_charges, prescription_cost, additional_cost, additional_items, total,
+                          gst_amount, round(final_total, 2))
+
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def _valid_admission_date(value) -> bool:
+    """True when calculate_bill can parse the admission date"""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def calculate_bills(patients: List[Dict[str, Any]], now=None, errors=None) -> List[Optional[Dict[str, Any]]]:
+    """
+    Bill the whole census at once. Dates and tariffs are applied as NumPy
+    arrays; every bill is identical to calculate_bill(patient, now). A patient
+    whose admission_date is missing or malformed gets None instead of failing
+    the batch, and is reported in `errors` if a list is given.
+    """
+    now = now or datetime.utcnow()
+    if not patients:
+        return []
+    
+    # Admission at midnight, so whole days elapsed == calendar-day difference
+    values = [p.get("admission_date") for p in patients]
+    valid = [isinstance(v, str) and _ISO_DATE.fullmatch(v) is not None for v in values]
+    if all(valid):
+        try:
+            admission_dates = np.array(values, dtype="datetime64[D]")
+        except ValueError:
+            # Well-formed but impossible dates ("2025-02-30"): find them row by row
+            valid = [_valid_admission_date(v) for v in values]
+    if not all(valid):
+        if errors is not None:
+            errors.extend(
+                {"patient_id": p.get("patient_id"), "error": f"invalid admission_date {p.get('admission_date')!r}"}
+                for p, ok in zip(patients, valid) if not ok
+            )
+        bills = iter(calculate_bills([p for p, ok in zip(patients, valid) if ok], now, errors))
+        return [next(bills) if ok else None for ok in valid]
+    
+    days_stayed = np.maximum((np.datetime64(now.date(), "D") - admission_dates).astype(np.int64), 1)
+    
+    # One table version for the whole census, even if a reload lands mid-run
+    tariffs = get_tariffs()
+    rows = np.array([tariffs.row(diagnosis_category(p), p.get("ward")) for p in patients])
+    columns = {field: column[rows] for field, column in tariffs.columns.items()}
+    
+    room_charges = columns["room_per_day"] * days_stayed
+    doctor_charges = columns["doctor_consultation"]
+    nursing_charges = columns["nursing_per_day"] * days_stayed
+    prescription_cost = columns["prescription_cost"]
+    additional_cost = columns["package_cost"]
+    total = room_charges + doctor_charges + nursing_charges + prescription_cost + additional_cost
+    gst_amount = total * tariffs.gst_rate
+    final_total = total + gst_amount
+    
+    discharge_date = now.strftime("%Y-%m-%d")
+    values = zip(rows.tolist(), days_stayed.tolist(), room_charges.tolist(), doctor_charges.tolist(),
+                 nursing_charges.tolist(), prescription_cost.tolist(), additional_cost.tolist(),
+                 total.tolist(), gst_amount.tolist(), final_total.tolist())
+    return [
+        # Python round() per element: np.round rounds halves differently
+        _bill_document(patient, tariffs, discharge_date, days, room, doctor, nursing, prescription, additional,
+                       list(tariffs.index[tariffs.keys[row]].items), subtotal, gst, round(final, 2))
+        for patient, (row, days, room, doctor, nursing, prescription, additional, subtotal, gst, final)
+        in zip(patients, values)
+    ]
+
+def _bill_document(patient, tariffs, discharge_date, days_stayed, room_charges, doctor_charges, nursing_charges,
+                   prescription_cost, additional_cost, additional_items, total, gst_amount, total_amount):
     return {
         "patient_id": patient["patient_id"],
         "patient_name": patient["name"],
         "admission_date": patient["admission_date"],
-        "discharge_date": datetime.utcnow().strftime("%Y-%m-%d"),
+        "discharge_date": discharge_date,
         "days_stayed": days_stayed,
         "breakdown": {
             "room_charges": room_charges,
@@ -84,9 +124,11 @@ def calculate_bill(patient):
             "additional_charges": additional_cost,
             "additional_items": additional_items,
             "subtotal": total,
-            "gst_18_percent": gst_amount
+            "gst_rate": tariffs.gst_rate,
+            "gst_amount": gst_amount
         },
-        "total_amount": round(final_total, 2),
-        "currency": "INR",
-        "currency_symbol": "₹"
-    }
\ No newline at end of file
+        "total_amount": total_amount,
+        "currency": tariffs.currency,
+        "currency_symbol": tariffs.currency_symbol,
+        "tariff_version": tariffs.version
+    }
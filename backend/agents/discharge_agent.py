@@ -1,34 +1,159 @@
 from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
-from typing import Dict, Any
+from llm_clients import get_llm, register_llm, run_async
+from prompts import register_prompt
+from typing import Dict, Any, List
 from datetime import datetime
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 import os
-from database import patients_collection, discharge_logs_collection
-groq_llm = ChatGroq(
-    api_key=os.getenv("GROQ_API_KEY"),
-    model="openai/gpt-oss-120b",
-    temperature=0
-)
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import patients_collection, discharge_logs_collection, workflow_state_collection
+from fingerprints import compute_fingerprint
+from agents.vitals_prescreen import prescreen_candidates
 
-def discharge_readiness_node(state: Dict[str, Any]) -> Dict[str, Any]:
+LLM_MODEL = "openai/gpt-oss-120b"
+LLM_TEMPERATURE = 0
+register_llm(LLM_MODEL, LLM_TEMPERATURE)
+
+# Max number of in-flight LLM calls when evaluating candidates concurrently
+DISCHARGE_CONCURRENCY = int(os.getenv("DISCHARGE_CONCURRENCY", "8"))
+
+EXECUTION_MODES = ("async", "sequential")
+
+# Set PRESCREEN_ENABLED=false to send every candidate to the LLM
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "true").lower() != "false"
+
+# Buffered patient updates / log entries are flushed every this many operations
+DETECTION_FLUSH_EVERY = int(os.getenv("DETECTION_FLUSH_EVERY", "500"))
+
+# Key of the detection run's document in workflow_state
+WATERMARK_ID = "discharge_detection"
+
+def load_candidates(since=None) -> List[Dict[str, Any]]:
     """
-    LangGraph node that evaluates patients for discharge readiness
+    Completed-but-not-ready patients. With `since`, only those updated after
+    the watermark or never evaluated are returned.
     """
-    print("🔍 Running Discharge Readiness Detection...")
-    
-    candidates = list(patients_collection.find({
+    query = {
         "treatment_status": "completed",
         "ready_for_discharge": False
-    }))
+    }
+    if since is not None:
+        query["$or"] = [
+            {"updated_at": {"$gt": since}},
+            {"discharge_evaluation.fingerprint": {"$exists": False}}
+        ]
+    return list(patients_collection.find(query))
+
+def readiness_fingerprint(patient: Dict[str, Any]) -> str:
+    """Fingerprint of every input the readiness decision depends on"""
+    return compute_fingerprint(
+        patient.get("vital_signs"),
+        patient.get("treatment_status"),
+        patient.get("updated_at")
+    )
+
+def get_watermark():
+    doc = workflow_state_collection.find_one({"_id": WATERMARK_ID})
+    return doc.get("watermark") if doc else None
+
+def set_watermark(watermark):
+    workflow_state_collection.update_one(
+        {"_id": WATERMARK_ID},
+        {"$set": {"watermark": watermark, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+class DetectionWriter:
+    """
+    Accumulates a detection run's patient updates and discharge log entries
+    and flushes them with unordered bulk_write / insert_many, either every
+    `flush_every` operations or when the run ends.
+    """
     
-    ready_patients = []
+    def __init__(self, flush_every=DETECTION_FLUSH_EVERY):
+        self.flush_every = max(1, flush_every)
+        self.patient_ops = []
+        self.patient_ids = []
+        self.log_entries = []
+        self.errors = []
+        self.round_trips = 0
+    
+    def update_patient(self, patient, update):
+        self.patient_ops.append(UpdateOne({"_id": patient["_id"]}, update))
+        self.patient_ids.append(patient["patient_id"])
+        self._maybe_flush()
+    
+    def log(self, entry):
+        self.log_entries.append(entry)
+        self._maybe_flush()
+    
+    def flush(self):
+        if self.patient_ops:
+            ops, ids = self.patient_ops, self.patient_ids
+            self.patient_ops, self.patient_ids = [], []
+            self.round_trips += 1
+            try:
+                patients_collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                self._collect_errors("patients", e, ids)
+        
+        if self.log_entries:
+            entries = self.log_entries
+            self.log_entries = []
+            self.round_trips += 1
+            try:
+                discharge_logs_collection.insert_many(entries, ordered=False)
+            except BulkWriteError as e:
+                self._collect_errors("discharge_logs", e, [entry["patient_id"] for entry in entries])
+    
+    def _maybe_flush(self):
+        if len(self.patient_ops) + len(self.log_entries) >= self.flush_every:
+            self.flush()
+    
+    def _collect_errors(self, collection, error, patient_ids):
+        for write_error in error.details.get("writeErrors", []):
+            self.errors.append({
+                "collection": collection,
+                "patient_id": patient_ids[write_error["index"]],
+                "error": write_error.get("errmsg", "")
+            })
+            print(f"⚠️ Bulk write to {collection} failed for {patient_ids[write_error['index']]}: {write_error.get('errmsg')}")
+
+def _record_evaluation(writer, patient, decision, details=None, agent=None):
+    """
+    Remember what was decided for these inputs so unchanged patients are
+    skipped next run; READY decisions also flag the patient and are logged.
+    """
+    now = datetime.utcnow()
+    update = {"discharge_evaluation": {
+        "fingerprint": readiness_fingerprint(patient),
+        "decision": decision,
+        "evaluated_at": now
+    }}
+    if decision == "READY":
+        update["ready_for_discharge"] = True
+        update["updated_at"] = now
+    writer.update_patient(patient, {"$set": update})
     
-    for patient in candidates:
-        # prompt for LLM evaluation
-        prompt = PromptTemplate(
-            input_variables=["patient_data"],
-            template="""
+    if decision == "READY":
+        writer.log({
+            "patient_id": patient["patient_id"],
+            "action": "discharge_readiness_detected",
+            "details": details,
+            "agent": agent,
+            "timestamp": now
+        })
+
+def _clear_evaluation(writer, patient):
+    """Forget a failed evaluation so the patient is retried on the next run"""
+    writer.update_patient(patient, {"$unset": {"discharge_evaluation": ""}})
+
+READINESS_PROMPT = register_prompt(
+    "discharge_readiness",
+    """
             You are a medical AI assistant evaluating patient discharge readiness.
             
             Patient Data:
@@ -45,47 +170,224 @@ def discharge_readiness_node(state: Dict[str, Any]) -> Dict[str, Any]:
             - No concerning symptoms
             
             Respond with only: "READY" or "NOT_READY" followed by a brief medical reason.
-            """
-        )
-        
-        formatted_prompt = prompt.format(
-            name=patient["name"],
-            age=patient["age"],
-            diagnosis=patient["diagnosis"],
-            vital_signs=patient["vital_signs"],
-            treatment_status=patient["treatment_status"]
-        )
-       
-        response = groq_llm.invoke(formatted_prompt)
-        decision = response.content.strip()
-        
-        if "READY" in decision:
-            
-            patients_collection.update_one(
-                {"_id": patient["_id"]},
-                {
-                    "$set": {
-                        "ready_for_discharge": True,
-                        "updated_at": datetime.utcnow()
-                    }
-                }
-            )
-         
-            discharge_logs_collection.insert_one({
+            """,
+    ["name", "age", "diagnosis", "vital_signs", "treatment_status"]
+)
+
+def build_readiness_prompt(patient: Dict[str, Any]) -> str:
+    """Render the discharge readiness prompt for a single patient"""
+    return READINESS_PROMPT.render(
+        name=patient["name"],
+        age=patient["age"],
+        diagnosis=patient["diagnosis"],
+        vital_signs=patient["vital_signs"],
+        treatment_status=patient["treatment_status"]
+    )
+
+def is_ready_decision(decision: str) -> bool:
+    """True when the LLM answered READY (and not NOT_READY)"""
+    return decision.strip().strip('"\'*').upper().startswith("READY")
+
+def _evaluation_result(patient, decision=None, error=None, llm_seconds=0.0):
+    return {
+        "patient_id": patient["patient_id"],
+        "name": patient["name"],
+        "decision": decision,
+        "error": error,
+        "llm_seconds": llm_seconds
+    }
+
+def evaluate_patient(patient: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluate one patient synchronously; errors are captured, not raised"""
+    started = time.perf_counter()
+    try:
+        response = get_llm(LLM_MODEL, LLM_TEMPERATURE).invoke(build_readiness_prompt(patient))
+        return _evaluation_result(patient, response.content.strip(), llm_seconds=time.perf_counter() - started)
+    except Exception as e:
+        return _evaluation_result(patient, error=str(e), llm_seconds=time.perf_counter() - started)
+
+async def aevaluate_patient(patient: Dict[str, Any], semaphore: asyncio.Semaphore, on_done=None) -> Dict[str, Any]:
+    """Evaluate one patient with ainvoke while holding a concurrency slot; on_done is awaited"""
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            response = await get_llm(LLM_MODEL, LLM_TEMPERATURE).ainvoke(build_readiness_prompt(patient))
+            result = _evaluation_result(patient, response.content.strip(), llm_seconds=time.perf_counter() - started)
+        except Exception as e:
+            result = _evaluation_result(patient, error=str(e), llm_seconds=time.perf_counter() - started)
+    if on_done:
+        await on_done(patient, result)
+    return result
+
+async def aevaluate_candidates(candidates: List[Dict[str, Any]], concurrency: int, on_done=None) -> List[Dict[str, Any]]:
+    """
+    Fan candidate evaluations out, at most `concurrency` at a time, preserving
+    order. `on_done(patient, result)` is called as each evaluation finishes.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    if on_done is None:
+        return await asyncio.gather(*(aevaluate_patient(patient, semaphore) for patient in candidates))
+    
+    # on_done does blocking Mongo writes (detection writer, job progress). It runs
+    # on one thread of its own so the shared LLM event loop never waits on a
+    # round-trip, and calls stay serial, as the writer expects.
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detection-results")
+    
+    async def done(patient, result):
+        await loop.run_in_executor(executor, on_done, patient, result)
+    
+    try:
+        return await asyncio.gather(*(aevaluate_patient(patient, semaphore, done) for patient in candidates))
+    finally:
+        executor.shutdown(wait=True)
+
+def load_candidates_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LangGraph node that loads the candidates whose readiness inputs changed
+    since their last evaluation. state["full_rescan"] ignores the watermark.
+    """
+    # Taken before the query so updates racing this run are picked up next time
+    state["run_started"] = datetime.utcnow()
+    
+    watermark = None if state.get("full_rescan") else get_watermark()
+    candidates = load_candidates(since=watermark)
+    
+    changed = candidates
+    if not state.get("full_rescan"):
+        changed = [
+            patient for patient in candidates
+            if (patient.get("discharge_evaluation") or {}).get("fingerprint") != readiness_fingerprint(patient)
+        ]
+    
+    state["candidates"] = changed
+    state["skipped_unchanged"] = len(candidates) - len(changed)
+    state["watermark"] = watermark
+    print(f"📋 {len(changed)} candidates to evaluate (watermark: {watermark})")
+    return state
+
+def prescreen_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LangGraph node that settles clear-cut candidates from their vital signs
+    and forwards only the ambiguous ones to the LLM node.
+    """
+    candidates = state["candidates"] if "candidates" in state else load_candidates()
+    
+    if not state.get("prescreen", PRESCREEN_ENABLED):
+        state["candidates"] = candidates
+        return state
+    
+    screened = prescreen_candidates(candidates)
+    for patient in screened["not_ready"]:
+        print(f"{patient['name']} not ready: {screened['reasons'][patient['patient_id']]}")
+    
+    state["candidates"] = screened["ambiguous"]
+    state["prescreen_ready"] = screened["ready"]
+    state["prescreen_not_ready"] = screened["not_ready"]
+    state["prescreen_reasons"] = screened["reasons"]
+    state["prescreen_counts"] = {
+        "ready": len(screened["ready"]),
+        "not_ready": len(screened["not_ready"]),
+        "ambiguous": len(screened["ambiguous"])
+    }
+    state["llm_calls_avoided"] = len(screened["ready"]) + len(screened["not_ready"])
+    print(f"🩺 Pre-screen settled {state['llm_calls_avoided']} of {len(candidates)} candidates without the LLM")
+    return state
+
+def discharge_readiness_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LangGraph node that evaluates patients for discharge readiness.
+
+    state["execution_mode"] selects "async" (default, concurrent ainvoke calls
+    bounded by state["concurrency"]) or "sequential" (one invoke at a time).
+    An optional state["on_result"] callable receives each patient's outcome.
+    """
+    print("🔍 Running Discharge Readiness Detection...")
+    
+    mode = state.get("execution_mode") or "async"
+    concurrency = state.get("concurrency") or DISCHARGE_CONCURRENCY
+    
+    # Upstream nodes hand over only changed, ambiguous candidates
+    candidates = state["candidates"] if "candidates" in state else load_candidates()
+    
+    ready_patients = []
+    errors = []
+    on_result = state.get("on_result")
+    writer = DetectionWriter(state.get("flush_every") or DETECTION_FLUSH_EVERY)
+    
+    def report(patient, decision, source, details=None, error=None):
+        if on_result:
+            on_result({
                 "patient_id": patient["patient_id"],
-                "action": "discharge_readiness_detected",
-                "details": f"AI Decision: {decision}",
-                "agent": "DischargeReadinessAgent",
-                "timestamp": datetime.utcnow()
+                "name": patient["name"],
+                "decision": decision,
+                "source": source,
+                "details": details,
+                "error": error
             })
-            
+    
+    for patient in state.get("prescreen_ready", []):
+        reason = state["prescreen_reasons"][patient["patient_id"]]
+        _record_evaluation(writer, patient, "READY", f"Rules Decision: {reason}", "VitalSignPrescreen")
+        ready_patients.append(patient["patient_id"])
+        report(patient, "READY", "prescreen", reason)
+        print(f"{patient['name']} marked as ready for discharge by vital-sign pre-screen")
+    
+    for patient in state.get("prescreen_not_ready", []):
+        _record_evaluation(writer, patient, "NOT_READY")
+        report(patient, "NOT_READY", "prescreen", state["prescreen_reasons"][patient["patient_id"]])
+    
+    def apply_result(patient, result):
+        if result["error"]:
+            _clear_evaluation(writer, patient)
+            errors.append({"patient_id": result["patient_id"], "error": result["error"]})
+            report(patient, None, "llm", error=result["error"])
+            print(f"⚠️ {patient['name']} evaluation failed: {result['error']}")
+            return
+        
+        decision = result["decision"]
+        if is_ready_decision(decision):
+            _record_evaluation(writer, patient, "READY", f"AI Decision: {decision}", "DischargeReadinessAgent")
             ready_patients.append(patient["patient_id"])
+            report(patient, "READY", "llm", decision)
             print(f"{patient['name']} marked as ready for discharge")
         else:
+            _record_evaluation(writer, patient, "NOT_READY")
+            report(patient, "NOT_READY", "llm", decision)
             print(f"{patient['name']} not ready: {decision}")
     
+    # Results are applied as each evaluation completes so progress can be streamed
+    started = time.perf_counter()
+    if mode == "sequential":
+        results = []
+        for patient in candidates:
+            results.append(evaluate_patient(patient))
+            apply_result(patient, results[-1])
+    else:
+        results = run_async(aevaluate_candidates(candidates, concurrency, on_done=apply_result))
+    wall_clock_seconds = time.perf_counter() - started
+    
+    writer.flush()
+    state["write_errors"] = writer.errors
+    state["db_round_trips"] = writer.round_trips
+    
+    if state.get("run_started"):
+        set_watermark(state["run_started"])
+    
+    llm_seconds_total = sum(result["llm_seconds"] for result in results)
+    
     state["ready_patients"] = ready_patients
-    state["processed_count"] = len(candidates)
+    state["processed_count"] = len(candidates) + state.get("llm_calls_avoided", 0)
+    state["llm_calls"] = len(candidates)
+    state.setdefault("llm_calls_avoided", 0)
+    state["errors"] = errors
+    state["execution_mode"] = mode
+    state["timing"] = {
+        "wall_clock_seconds": round(wall_clock_seconds, 3),
+        "llm_seconds_total": round(llm_seconds_total, 3),
+        "speedup": round(llm_seconds_total / wall_clock_seconds, 2) if wall_clock_seconds > 0 else None,
+        "concurrency": concurrency if mode == "async" else 1
+    }
     return state
 
 def start_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -99,9 +401,13 @@ def create_discharge_workflow():
     workflow = StateGraph(dict)
 
     workflow.add_node("start", start_node)
+    workflow.add_node("load_candidates", load_candidates_node)
+    workflow.add_node("prescreen", prescreen_node)
     workflow.add_node("discharge_readiness", discharge_readiness_node)
 
-    workflow.add_edge("start", "discharge_readiness")
+    workflow.add_edge("start", "load_candidates")
+    workflow.add_edge("load_candidates", "prescreen")
+    workflow.add_edge("prescreen", "discharge_readiness")
     workflow.add_edge("discharge_readiness", END)
 
     workflow.set_entry_point("start")
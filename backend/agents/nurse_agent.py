@@ -1,19 +1,18 @@
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
-import os
-
-groq_llm = ChatGroq(
-    api_key=os.getenv("GROQ_API_KEY"),
-    model="llama-3.1-70b-versatile",
-    temperature=0.3
-)
+from llm_clients import get_llm, register_llm
+from prompts import register_prompt
+from database import checklist_templates_collection
+from diagnosis_taxonomy import care_plan_category
+from pymongo import ReturnDocument
+from datetime import datetime
+import re
 
-def generate_nurse_checklist(patient):
-    """Generate diagnosis-specific nurse discharge checklist using AI"""
-    
-    prompt = PromptTemplate(
-        input_variables=["patient_data"],
-        template="""
+LLM_MODEL = "llama-3.1-70b-versatile"
+LLM_TEMPERATURE = 0.3
+register_llm(LLM_MODEL, LLM_TEMPERATURE)
+
+CHECKLIST_PROMPT = register_prompt(
+    "nurse_checklist",
+    """
 You are a senior nursing supervisor creating a discharge checklist.
 
 PATIENT INFORMATION:
@@ -36,10 +35,111 @@ Return ONLY a comma-separated list of tasks. No numbering, bullets, or extra tex
 EXAMPLE FORMAT:
 Administer final dose of IV antibiotics, Remove central line and dress site, Check and record final vital signs including oxygen saturation, Verify patient can self-administer insulin injections, Provide diabetic diet education, Review blood glucose monitoring technique, Ensure follow-up appointment scheduled, Collect and verify all discharge documentation
 
-YOUR TASKS (specific to {diagnosis}):"""
+YOUR TASKS (specific to {diagnosis}):""",
+    ["name", "age", "diagnosis", "blood_pressure", "heart_rate", "temperature", "oxygen_saturation"]
+)
+
+# (upper age bound, band) - checklists are shared per diagnosis within a band
+AGE_BANDS = ((17, "pediatric"), (64, "adult"), (200, "senior"))
+
+def normalize_diagnosis(diagnosis):
+    """'Acute  Myocardial-Infarction ' -> 'acute myocardial infarction'"""
+    return re.sub(r"[^a-z0-9]+", " ", (diagnosis or "").lower()).strip()
+
+def age_band(age):
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "adult"
+    for upper, band in AGE_BANDS:
+        if age <= upper:
+            return band
+    return AGE_BANDS[-1][1]
+
+def template_key(patient):
+    return f"{normalize_diagnosis(patient.get('diagnosis'))}|{age_band(patient.get('age'))}"
+
+def generate_nurse_checklist(patient, refresh=False):
+    """
+    Diagnosis-specific nurse discharge checklist and where it came from
+    ("template", "llm" or "fallback"). Served from the template library when
+    a checklist for the same diagnosis and age band exists; otherwise (or with
+    refresh=True) generated with AI and stored as a template.
+    """
+    key = template_key(patient)
+    
+    if not refresh:
+        template = checklist_templates_collection.find_one_and_update(
+            {"_id": key, "tasks.0": {"$exists": True}},
+            {"$inc": {"hits": 1}, "$set": {"last_used_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if template:
+            return template["tasks"], "template"
+    
+    checklist_templates_collection.update_one(
+        {"_id": key},
+        {
+            "$inc": {"misses": 1},
+            "$setOnInsert": _template_identity(patient, key)
+        },
+        upsert=True
     )
     
-    formatted_prompt = prompt.format(
+    tasks = _generate_checklist_with_ai(patient)
+    if tasks is None:
+        return generate_fallback_checklist(patient), "fallback"
+    
+    save_checklist_template(patient, tasks, source="llm")
+    return tasks, "llm"
+
+def save_checklist_template(patient, tasks, source):
+    """Store `tasks` as the template for this patient's diagnosis and age band"""
+    key = template_key(patient)
+    checklist_templates_collection.update_one(
+        {"_id": key},
+        {
+            "$set": {"tasks": tasks, "source": source, "updated_at": datetime.utcnow()},
+            "$setOnInsert": {**_template_identity(patient, key), "hits": 0, "misses": 0}
+        },
+        upsert=True
+    )
+
+def checklist_template_stats():
+    """Hits, misses and hit rate per normalized diagnosis, across age bands"""
+    stats = checklist_templates_collection.aggregate([
+        {"$group": {
+            "_id": "$diagnosis_key",
+            "hits": {"$sum": {"$ifNull": ["$hits", 0]}},
+            "misses": {"$sum": {"$ifNull": ["$misses", 0]}},
+            "templates": {"$sum": 1}
+        }},
+        {"$sort": {"_id": 1}}
+    ])
+    report = []
+    for row in stats:
+        lookups = row["hits"] + row["misses"]
+        report.append({
+            "diagnosis": row["_id"],
+            "templates": row["templates"],
+            "hits": row["hits"],
+            "misses": row["misses"],
+            "hit_rate": round(row["hits"] / lookups, 3) if lookups else None
+        })
+    return report
+
+def _template_identity(patient, key):
+    return {
+        "diagnosis_key": key.split("|")[0],
+        "age_band": key.split("|")[1],
+        "diagnosis": patient.get("diagnosis"),
+        "created_at": datetime.utcnow()
+    }
+
+def _generate_checklist_with_ai(patient):
+    """6-8 AI-generated tasks, or None if the model failed or returned too few"""
+    
+    formatted_prompt = CHECKLIST_PROMPT.render(
         name=patient["name"],
         age=patient["age"],
         diagnosis=patient["diagnosis"],
@@ -50,7 +150,7 @@ YOUR TASKS (specific to {diagnosis}):"""
     )
     
     try:
-        response = groq_llm.invoke(formatted_prompt)
+        response = get_llm(LLM_MODEL, LLM_TEMPERATURE).invoke(formatted_prompt)
         
         # Parse comma-separated tasks
         raw_tasks = response.content.strip()
@@ -62,19 +162,19 @@ YOUR TASKS (specific to {diagnosis}):"""
         # Ensure 6-8 tasks
         if len(tasks) < 6:
             print(f"⚠️ AI generated only {len(tasks)} tasks, using fallback")
-            return generate_fallback_checklist(patient)
+            return None
         
         return tasks[:8]
         
     except Exception as e:
         print(f"⚠️ Error generating checklist with AI: {e}")
-        return generate_fallback_checklist(patient)
+        return None
 
 def generate_fallback_checklist(patient):
     """Generate diagnosis-specific checklist if AI fails"""
-    diagnosis = patient['diagnosis'].lower()
+    category = care_plan_category(patient)
     
-    if "myocardial" in diagnosis or "heart" in diagnosis:
+    if category == "cardiac":
         return [
             "Administer final cardiac medications and document response",
             "Remove cardiac monitoring leads and check skin integrity",
@@ -86,7 +186,7 @@ def generate_fallback_checklist(patient):
             "Verify patient has blood pressure monitor at home"
         ]
     
-    elif "appendicitis" in diagnosis or "surgery" in diagnosis:
+    elif category == "surgical":
         return [
             "Administer final dose of prophylactic antibiotics",
             "Remove surgical drain if present and document output",
@@ -98,7 +198,7 @@ def generate_fallback_checklist(patient):
             "Ensure surgical follow-up scheduled for suture removal"
         ]
     
-    elif "copd" in diagnosis or "pneumonia" in diagnosis or "asthma" in diagnosis:
+    elif category == "respiratory":
         return [
             "Administer final nebulizer treatment and document response",
             "Remove oxygen therapy and assess room air saturation",
@@ -110,7 +210,7 @@ def generate_fallback_checklist(patient):
             "Ensure respiratory follow-up scheduled within 5-7 days"
         ]
     
-    elif "diabetes" in diagnosis:
+    elif category == "diabetes":
         return [
             "Check fasting blood glucose and document",
             "Demonstrate blood glucose monitoring technique",
@@ -122,7 +222,7 @@ def generate_fallback_checklist(patient):
             "Verify patient has glucose meter and supplies"
         ]
     
-    elif "fracture" in diagnosis:
+    elif category == "fracture":
         return [
             "Assess cast integrity and circulation to extremity",
             "Check for signs of compartment syndrome",
@@ -134,7 +234,7 @@ def generate_fallback_checklist(patient):
             "Verify patient can safely navigate home environment"
         ]
     
-    elif "stroke" in diagnosis:
+    elif category == "stroke":
         return [
             "Assess neurological status and document any changes",
             "Check blood pressure and ensure within target range",
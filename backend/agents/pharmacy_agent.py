@@ -1,21 +1,14 @@
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
-import os
-
-groq_llm = ChatGroq(
-    api_key=os.getenv("GROQ_API_KEY"),
-    model="llama-3.1-70b-versatile",
-    temperature=0.3
-)
+from llm_clients import get_llm, register_llm
+from prompts import register_prompt
+from diagnosis_taxonomy import CARE_PLAN_PRIORITY, care_plan_category, classify_diagnosis
 
-def generate_prescription(patient, nurse_tasks):
-    """Generate diagnosis-specific prescription using AI"""
-    
-    nurse_notes = nurse_tasks.get("handover_note", "") if nurse_tasks else "No nurse notes available"
-    
-    prompt = PromptTemplate(
-        input_variables=["patient_data"],
-        template="""
+LLM_MODEL = "llama-3.1-70b-versatile"
+LLM_TEMPERATURE = 0.3
+register_llm(LLM_MODEL, LLM_TEMPERATURE)
+
+PRESCRIPTION_PROMPT = register_prompt(
+    "pharmacy_prescription",
+    """
 You are an expert clinical pharmacist generating a discharge prescription.
 
 PATIENT INFORMATION:
@@ -57,10 +50,14 @@ FOLLOW-UP:
 - Watch for: [specific symptoms to monitor]
 - Emergency signs: [when to seek immediate help]
 
-BE SPECIFIC AND CLINICAL. Use actual drug names relevant to the diagnosis."""
-    )
+BE SPECIFIC AND CLINICAL. Use actual drug names relevant to the diagnosis.""",
+    ["name", "age", "diagnosis", "bp", "hr", "temp", "nurse_notes"]
+)
+
+def build_prescription_prompt(patient, nurse_tasks):
+    nurse_notes = nurse_tasks.get("handover_note", "") if nurse_tasks else "No nurse notes available"
     
-    formatted_prompt = prompt.format(
+    return PRESCRIPTION_PROMPT.render(
         name=patient["name"],
         age=patient["age"],
         diagnosis=patient["diagnosis"],
@@ -69,20 +66,46 @@ BE SPECIFIC AND CLINICAL. Use actual drug names relevant to the diagnosis."""
         temp=patient["vital_signs"]["temperature"],
         nurse_notes=nurse_notes
     )
-    
+
+def generate_prescription(patient, nurse_tasks):
+    """Generate diagnosis-specific prescription using AI"""
+    prescription = generate_ai_prescription(patient, nurse_tasks)
+    if prescription is None:
+        return generate_fallback_prescription(patient)
+    return prescription
+
+def generate_ai_prescription(patient, nurse_tasks):
+    """AI-generated prescription, or None if the model call failed"""
     try:
-        response = groq_llm.invoke(formatted_prompt)
+        response = get_llm(LLM_MODEL, LLM_TEMPERATURE).invoke(build_prescription_prompt(patient, nurse_tasks))
         return response.content.strip()
     except Exception as e:
         print(f"⚠️ Error generating prescription with AI: {e}")
-        return generate_fallback_prescription(patient)
+        return None
+
+def stream_prescription(patient, nurse_tasks):
+    """Yield the prescription text as the model produces it"""
+    for chunk in get_llm(LLM_MODEL, LLM_TEMPERATURE).stream(build_prescription_prompt(patient, nurse_tasks)):
+        if chunk.content:
+            yield chunk.content
+
+# The respiratory fallback includes an antibiotic course, so it is only given
+# for these; asthma gets the plan for its other categories, or the general one
+RESPIRATORY_REGIMEN_KEYWORDS = ("copd", "pneumonia")
+
+def _prescription_category(patient):
+    category = care_plan_category(patient)
+    diagnosis = (patient.get("diagnosis") or "").lower()
+    if category == "respiratory" and not any(keyword in diagnosis for keyword in RESPIRATORY_REGIMEN_KEYWORDS):
+        category = classify_diagnosis(diagnosis, tuple(c for c in CARE_PLAN_PRIORITY if c != "respiratory"))
+    return category
 
 def generate_fallback_prescription(patient):
     """Generate basic prescription if AI fails"""
-    diagnosis = patient['diagnosis'].lower()
+    category = _prescription_category(patient)
     
     # Diagnosis-specific prescriptions
-    if "myocardial" in diagnosis or "heart" in diagnosis:
+    if category == "cardiac":
         return """
 MEDICATIONS:
 1. Aspirin - 75mg - Once daily - Morning after breakfast - 30 days
@@ -111,7 +134,7 @@ FOLLOW-UP:
 - Emergency signs: Severe chest pain, difficulty breathing
 """
     
-    elif "appendicitis" in diagnosis:
+    elif category == "surgical":
         return """
 MEDICATIONS:
 1. Cefuroxime - 500mg - Twice daily - After meals - 7 days
@@ -140,7 +163,7 @@ FOLLOW-UP:
 - Emergency signs: High fever (>101°F), severe abdominal pain
 """
     
-    elif "copd" in diagnosis or "pneumonia" in diagnosis:
+    elif category == "respiratory":
         return """
 MEDICATIONS:
 1. Salbutamol Inhaler - 2 puffs - Four times daily - Before meals & bedtime - 30 days
@@ -169,7 +192,7 @@ FOLLOW-UP:
 - Emergency signs: Severe difficulty breathing, blue lips
 """
     
-    elif "diabetes" in diagnosis:
+    elif category == "diabetes":
         return """
 MEDICATIONS:
 1. Metformin - 500mg - Twice daily - After breakfast & dinner - 30 days
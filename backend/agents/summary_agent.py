@@ -1,28 +1,28 @@
 from langgraph.graph import StateGraph, END
-from langchain_groq import ChatGroq
-from langchain.prompts import PromptTemplate
+from llm_clients import get_llm, register_llm
+from prompts import register_prompt
 from typing import Dict, Any
 from datetime import datetime
-import os
 from database import patients_collection, discharge_logs_collection
 
-groq_llm = ChatGroq(
-    api_key=os.getenv("GROQ_API_KEY"),
-    model="openai/gpt-oss-120b",
-    temperature=0
-)
+LLM_MODEL = "openai/gpt-oss-120b"
+LLM_TEMPERATURE = 0
+register_llm(LLM_MODEL, LLM_TEMPERATURE)
 
-def summary_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    LangGraph node to generate discharge summary for a patient
+SUMMARY_PROMPT = register_prompt(
+    "discharge_summary",
     """
-    patient = state["patient"]
-    
-    # summary prompt
-    prompt = PromptTemplate(
-    input_variables=["name", "age", "diagnosis", "admission_date", "treatment_status", "ready_for_discharge", "vital_signs"],
-    template="""
 You are an AI medical assistant generating a highly structured, printable hospital discharge summary.
+
+PATIENT DETAILS:
+Name: {name}
+Age: {age}
+Diagnosis: {diagnosis}
+Admission Date: {admission_date}
+Treatment Status: {treatment_status}
+Ready for Discharge: {ready_for_discharge}
+Vital Signs: {vital_signs}
+
 ONLY use this format (plain text, do not use asterisks or markdown):
 
 AI-Generated Summary
@@ -43,22 +43,45 @@ Doctor's Comments
 [Free text, max 4 sentences.]
 
 Never use asterisks or double stars. Never nest points. Insert a single blank line between each section.
-"""
+""",
+    ["name", "age", "diagnosis", "admission_date", "treatment_status", "ready_for_discharge", "vital_signs"]
+)
+
+def build_summary_prompt(patient: Dict[str, Any]) -> str:
+    return SUMMARY_PROMPT.render(
+        name=patient["name"],
+        age=patient["age"],
+        diagnosis=patient.get("diagnosis", ""),
+        admission_date=patient.get("admission_date", ""),
+        treatment_status=patient.get("treatment_status", ""),
+        ready_for_discharge="YES" if patient.get("ready_for_discharge") else "NO",
+        vital_signs=patient.get("vital_signs", {})
     )
 
-    formatted_prompt = prompt.format(
-    name=patient["name"],
-    age=patient["age"],
-    diagnosis=patient.get("diagnosis", ""),
-    admission_date=patient.get("admission_date", ""),
-    treatment_status=patient.get("treatment_status", ""),
-    ready_for_discharge="YES" if patient.get("ready_for_discharge") else "NO",
-    vital_signs=patient.get("vital_signs", {})
-)
+def summary_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    LangGraph node to generate discharge summary for a patient
+    """
+    patient = state["patient"]
+    formatted_prompt = build_summary_prompt(patient)
 
-    response = groq_llm.invoke(formatted_prompt)
+    response = get_llm(LLM_MODEL, LLM_TEMPERATURE).invoke(formatted_prompt)
     summary = response.content.strip()
     
+    _log_summary(patient, summary)
+    state["summary"] = summary
+    return state
+
+def stream_summary(patient: Dict[str, Any]):
+    """Yield the discharge summary text as the model produces it; logs once complete"""
+    parts = []
+    for chunk in get_llm(LLM_MODEL, LLM_TEMPERATURE).stream(build_summary_prompt(patient)):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    _log_summary(patient, "".join(parts).strip())
+
+def _log_summary(patient, summary):
     discharge_logs_collection.insert_one({
         "patient_id": patient["patient_id"],
         "action": "discharge_summary_generated",
@@ -66,8 +89,6 @@ Never use asterisks or double stars. Never nest points. Insert a single blank li
         "agent": "SummaryAgent",
         "timestamp": datetime.utcnow()
     })
-    state["summary"] = summary
-    return state
 
 def start_node(state: Dict[str, Any]) -> Dict[str, Any]:
     print("🚀 Starting Summary Workflow...")
@@ -0,0 +1,148 @@
+import json
+import os
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from diagnosis_taxonomy import diagnosis_category
+
+# Vitals in column order of the matrix built by vitals_matrix()
+VITALS = ("systolic", "diastolic", "heart_rate", "temperature", "respiratory_rate", "oxygen_saturation")
+
+# Each band maps a vital to an inclusive (low, high) range.
+#   stable   - every vital inside this band => definitely READY
+#   critical - any vital outside this band  => definitely NOT_READY
+# Anything in between (or with missing vitals) is ambiguous and goes to the LLM.
+DEFAULT_THRESHOLDS = {
+    "stable": {
+        "systolic": (90, 135),
+        "diastolic": (60, 85),
+        "heart_rate": (60, 100),
+        "temperature": (97.0, 99.5),
+        "respiratory_rate": (12, 20),
+        "oxygen_saturation": (95, 100)
+    },
+    "critical": {
+        "systolic": (85, 180),
+        "diastolic": (50, 110),
+        "heart_rate": (45, 120),
+        "temperature": (95.0, 100.4),
+        "respiratory_rate": (8, 26),
+        "oxygen_saturation": (90, 100)
+    }
+}
+
+# Per-diagnosis overrides, merged over DEFAULT_THRESHOLDS band by band
+DIAGNOSIS_THRESHOLDS = {
+    "cardiac": {
+        "stable": {"systolic": (90, 130), "heart_rate": (55, 90)},
+        "critical": {"systolic": (85, 160), "heart_rate": (45, 110)}
+    },
+    "stroke": {
+        "stable": {"systolic": (100, 140), "diastolic": (60, 90)},
+        "critical": {"systolic": (90, 185)}
+    },
+    "respiratory": {
+        "stable": {"oxygen_saturation": (94, 100), "respiratory_rate": (12, 22)},
+        "critical": {"oxygen_saturation": (88, 100)}
+    },
+    "diabetes": {},
+    "surgical": {
+        "stable": {"temperature": (97.0, 99.3)}
+    }
+}
+DIAGNOSIS_THRESHOLDS["fracture"] = DIAGNOSIS_THRESHOLDS["surgical"]
+
+def load_thresholds(path=None):
+    """
+    Build the per-diagnosis threshold table, optionally overridden by a JSON
+    file shaped like {"default": {"stable": {...}}, "cardiac": {...}}.
+    """
+    overrides = {}
+    path = path or os.getenv("PRESCREEN_THRESHOLDS_FILE")
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+    
+    default = _merge_bands(DEFAULT_THRESHOLDS, overrides.get("default", {}))
+    table = {"default": default}
+    for category in set(DIAGNOSIS_THRESHOLDS) | (set(overrides) - {"default"}):
+        merged = _merge_bands(default, DIAGNOSIS_THRESHOLDS.get(category, {}))
+        table[category] = _merge_bands(merged, overrides.get(category, {}))
+    return table
+
+def _merge_bands(base, override):
+    merged = {}
+    for band in ("stable", "critical"):
+        merged[band] = dict(base.get(band, {}))
+        merged[band].update({vital: tuple(bounds) for vital, bounds in override.get(band, {}).items()})
+    return merged
+
+THRESHOLDS = load_thresholds()
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def vitals_matrix(candidates: List[Dict[str, Any]]) -> np.ndarray:
+    """(n_patients, len(VITALS)) float matrix; missing or unparseable vitals are NaN"""
+    rows = []
+    for patient in candidates:
+        vitals = patient.get("vital_signs") or {}
+        systolic, _, diastolic = str(vitals.get("blood_pressure", "")).partition("/")
+        rows.append((
+            _to_float(systolic),
+            _to_float(diastolic),
+            _to_float(vitals.get("heart_rate")),
+            _to_float(vitals.get("temperature")),
+            _to_float(vitals.get("respiratory_rate")),
+            _to_float(vitals.get("oxygen_saturation"))
+        ))
+    return np.array(rows, dtype=float).reshape(len(rows), len(VITALS))
+
+def _bounds_table(thresholds, categories, band) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-category low/high arrays of shape (n_categories, len(VITALS))"""
+    lows = np.array([[thresholds[c][band].get(v, (-np.inf, np.inf))[0] for v in VITALS] for c in categories], dtype=float)
+    highs = np.array([[thresholds[c][band].get(v, (-np.inf, np.inf))[1] for v in VITALS] for c in categories], dtype=float)
+    return lows, highs
+
+def prescreen_candidates(candidates: List[Dict[str, Any]], thresholds=None) -> Dict[str, Any]:
+    """
+    Classify every candidate at once as ready / not_ready / ambiguous.
+    Returns the patients in each bucket plus a reason per decided patient_id.
+    """
+    thresholds = thresholds or THRESHOLDS
+    result = {"ready": [], "not_ready": [], "ambiguous": [], "reasons": {}}
+    if not candidates:
+        return result
+    
+    categories = sorted(thresholds)
+    category_index = {category: i for i, category in enumerate(categories)}
+    patient_categories = [diagnosis_category(p) for p in candidates]
+    rows = np.array([category_index.get(c, category_index["default"]) for c in patient_categories])
+    
+    values = vitals_matrix(candidates)
+    stable_low, stable_high = _bounds_table(thresholds, categories, "stable")
+    critical_low, critical_high = _bounds_table(thresholds, categories, "critical")
+    
+    # NaN compares False both ways: a missing vital is never stable and never critical
+    in_stable = (values >= stable_low[rows]) & (values <= stable_high[rows])
+    out_of_critical = (values < critical_low[rows]) | (values > critical_high[rows])
+    
+    not_ready = out_of_critical.any(axis=1)
+    ready = in_stable.all(axis=1) & ~not_ready
+    
+    for i, patient in enumerate(candidates):
+        category = patient_categories[i]
+        if not_ready[i]:
+            flagged = [VITALS[j] for j in np.flatnonzero(out_of_critical[i])]
+            result["not_ready"].append(patient)
+            result["reasons"][patient["patient_id"]] = f"NOT_READY - {', '.join(flagged)} outside critical range for {category}"
+        elif ready[i]:
+            result["ready"].append(patient)
+            result["reasons"][patient["patient_id"]] = f"READY - all vital signs within stable range for {category}"
+        else:
+            result["ambiguous"].append(patient)
+    return result
@@ -0,0 +1,171 @@
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from database import patients_collection, revenue_rollups_collection, census_rollups_collection
+from diagnosis_taxonomy import diagnosis_category
+
+# Fields of the pre-transition patient document the rollups need
+_ROLLUP_PROJECTION = {"_id": 0, "status": 1, "diagnosis": 1, "diagnosis_category": 1, "bill": 1}
+
+# Patient workflow, earliest stage first
+PATIENT_STAGES = (
+    "pending", "doctor_approved", "nurse_completed", "pharmacy_completed",
+    "summary_completed", "billing_completed", "discharge_complete"
+)
+
+def update_patient_stage(patient_id, status, fields=None, advance_only=False):
+    """
+    Move a patient to `status` (setting any extra `fields`) and shift the
+    census rollup from the old status to the new one. With advance_only, a
+    patient already at `status` or a later stage keeps its status and only
+    gets `fields`. Returns the patient as it was before the update, or None
+    if there is no such patient.
+    """
+    query = {"patient_id": patient_id}
+    if advance_only and status in PATIENT_STAGES:
+        query["status"] = {"$nin": list(PATIENT_STAGES[PATIENT_STAGES.index(status):])}
+    
+    previous = patients_collection.find_one_and_update(
+        query,
+        {"$set": {"status": status, **(fields or {})}},
+        projection=_ROLLUP_PROJECTION,
+        return_document=ReturnDocument.BEFORE
+    )
+    if previous is None and advance_only:
+        # Already at or past `status`: never move it (or the census) backwards
+        if not fields:
+            return patients_collection.find_one({"patient_id": patient_id}, _ROLLUP_PROJECTION)
+        return patients_collection.find_one_and_update(
+            {"patient_id": patient_id},
+            {"$set": fields},
+            projection=_ROLLUP_PROJECTION,
+            return_document=ReturnDocument.BEFORE
+        )
+    if previous and previous.get("status") != status:
+        category = diagnosis_category(previous)
+        if previous.get("status"):
+            _bump_census(previous["status"], category, -1)
+        _bump_census(status, category, 1)
+    return previous
+
+def record_bill(patient, bill, previous_bill=None):
+    """Add `bill` to the revenue rollup, replacing `previous_bill` if the patient was billed before"""
+    category = diagnosis_category(patient)
+    if previous_bill:
+        _bump_revenue(previous_bill, category, -1)
+    _bump_revenue(bill, category, 1)
+
+def _bump_census(status, category, delta):
+    census_rollups_collection.update_one(
+        {"_id": f"{status}|{category}"},
+        {
+            "$inc": {"patients": delta},
+            "$set": {"status": status, "category": category, "updated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+def _bump_revenue(bill, category, sign):
+    day = bill.get("discharge_date")
+    if not day:
+        return
+    revenue_rollups_collection.update_one(
+        {"_id": f"{day}|{category}"},
+        {
+            "$inc": {"revenue": sign * float(bill.get("total_amount", 0)), "bills": sign},
+            "$set": {"day": day, "category": category, "updated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+def rebuild_rollups():
+    """Recompute both rollups from the patients collection"""
+    category = {"$ifNull": ["$diagnosis_category", "general"]}
+    now = datetime.utcnow()
+
+    census = [
+        {
+            "_id": f"{row['_id']['status']}|{row['_id']['category']}",
+            "status": row["_id"]["status"],
+            "category": row["_id"]["category"],
+            "patients": row["patients"],
+            "updated_at": now
+        }
+        for row in patients_collection.aggregate([
+            {"$match": {"status": {"$exists": True}}},
+            {"$group": {"_id": {"status": "$status", "category": category}, "patients": {"$sum": 1}}}
+        ])
+    ]
+    revenue = [
+        {
+            "_id": f"{row['_id']['day']}|{row['_id']['category']}",
+            "day": row["_id"]["day"],
+            "category": row["_id"]["category"],
+            "revenue": row["revenue"],
+            "bills": row["bills"],
+            "updated_at": now
+        }
+        for row in patients_collection.aggregate([
+            {"$match": {"bill.discharge_date": {"$exists": True}}},
+            {"$group": {
+                "_id": {"day": "$bill.discharge_date", "category": category},
+                "revenue": {"$sum": "$bill.total_amount"},
+                "bills": {"$sum": 1}
+            }}
+        ])
+    ]
+
+    census_rollups_collection.delete_many({})
+    revenue_rollups_collection.delete_many({})
+    if census:
+        census_rollups_collection.insert_many(census)
+    if revenue:
+        revenue_rollups_collection.insert_many(revenue)
+    print(f"📊 Rollups rebuilt: {len(census)} census rows, {len(revenue)} revenue rows")
+
+def ensure_rollups():
+    """Build the rollups on first start against an existing patient history"""
+    if census_rollups_collection.estimated_document_count() == 0 and patients_collection.estimated_document_count() > 0:
+        rebuild_rollups()
+
+def revenue_report(start=None, end=None):
+    """Revenue per day (with a per-category split) and per category, read from the rollup"""
+    query = {}
+    if start or end:
+        query["day"] = {**({"$gte": start} if start else {}), **({"$lte": end} if end else {})}
+
+    by_day, by_category = {}, {}
+    for row in revenue_rollups_collection.find(query, {"_id": 0}).sort("day", 1):
+        if row["bills"] <= 0:
+            continue
+        day = by_day.setdefault(row["day"], {"day": row["day"], "revenue": 0.0, "bills": 0, "by_category": {}})
+        day["revenue"] += row["revenue"]
+        day["bills"] += row["bills"]
+        day["by_category"][row["category"]] = round(row["revenue"], 2)
+        category = by_category.setdefault(row["category"], {"revenue": 0.0, "bills": 0})
+        category["revenue"] += row["revenue"]
+        category["bills"] += row["bills"]
+
+    for entry in list(by_day.values()) + list(by_category.values()):
+        entry["revenue"] = round(entry["revenue"], 2)
+    return {
+        "by_day": list(by_day.values()),
+        "by_category": by_category,
+        "total_revenue": round(sum(entry["revenue"] for entry in by_category.values()), 2),
+        "total_bills": sum(entry["bills"] for entry in by_category.values())
+    }
+
+def census_report():
+    """Patients per status and per diagnosis category, read from the rollup"""
+    by_status, by_category, rows = {}, {}, []
+    for row in census_rollups_collection.find({"patients": {"$gt": 0}}, {"_id": 0, "updated_at": 0}):
+        rows.append(row)
+        by_status[row["status"]] = by_status.get(row["status"], 0) + row["patients"]
+        by_category[row["category"]] = by_category.get(row["category"], 0) + row["patients"]
+    return {
+        "by_status": by_status,
+        "by_category": by_category,
+        "by_status_and_category": rows,
+        "total": sum(by_status.values())
+    }
@@ -1,23 +1,36 @@
 from fastapi.responses import FileResponse, StreamingResponse
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from io import BytesIO
-from email_service import send_nurse_notification, send_discharge_summary_to_guardian, send_test_email
+import threading
+from email_service import send_test_email, smtp_pool
 from database import get_nurse_email
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
+from typing import Optional
+from pymongo import ReturnDocument
 from database import (
     patients_collection, 
     discharge_logs_collection,
     nurse_tasks_collection,
-    init_sample_data
+    email_outbox_collection,
+    init_sample_data,
+    init_indexes,
+    backfill_diagnosis_categories,
+    nurse_dashboard_pipeline,
+    pharmacy_queue_pipeline
 )
 from models import Patient, PatientUpdate
-from agents.discharge_agent import discharge_workflow
+from fingerprints import clinical_fingerprint
+from diagnosis_taxonomy import diagnosis_category
+from analytics import update_patient_stage, record_bill, ensure_rollups, rebuild_rollups, revenue_report, census_report
+from agents.discharge_agent import EXECUTION_MODES
+from detection_jobs import start_job, get_job, stream_job_events, detection_running
+from scheduler import detection_scheduler
+from llm_clients import warm_up, LLM_WARMUP
+from pdf_service import shutdown_pdf_pool, document_patient, PdfQueueFull
+from pdf_cache import pdf_cache, get_or_render, document_key, document_etag
+from email_outbox import (
+    email_outbox, enqueue_nurse_notification, enqueue_guardian_packet, requeue, outbox_counts, OUTBOX_STATUSES
+)
 
 app = FastAPI(title="MediFlow AI", description="AI-powered hospital discharge system")
 
@@ -33,6 +46,23 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     init_sample_data()
+    init_indexes()
+    backfill_diagnosis_categories()
+    ensure_rollups()
+    detection_scheduler.start()
+    email_outbox.start()
+    
+    if LLM_WARMUP:
+        # Importing the agents registers the models they use
+        import agents.nurse_agent, agents.pharmacy_agent, agents.summary_agent
+        threading.Thread(target=warm_up, name="llm-warm-up", daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    detection_scheduler.stop()
+    email_outbox.stop()
+    shutdown_pdf_pool()
+    smtp_pool.close()
 
 @app.get("/")
 def root():
@@ -72,6 +102,9 @@ def update_patient(patient_id: str, update: PatientUpdate):
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Patient not found")
     
+    if update.vital_signs:
+        detection_scheduler.notify_vitals_update()
+    
     return {"message": "Patient updated successfully"}
 
 @app.post("/api/patients/{patient_id}/approve")
@@ -82,16 +115,12 @@ def approve_patient_discharge(patient_id: str):
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    result = patients_collection.update_one(
-        {"patient_id": patient_id},
-        {"$set": {
-            "status": "doctor_approved",
-            "approved_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }}
-    )
+    previous = update_patient_stage(patient_id, "doctor_approved", {
+        "approved_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    })
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     
     # Log the approval
@@ -103,33 +132,69 @@ def approve_patient_discharge(patient_id: str):
         "timestamp": datetime.utcnow()
     })
     
-    # 🔔 SEND EMAIL TO NURSE
+    # 🔔 QUEUE EMAIL TO NURSE (delivered by the outbox workers)
+    notification_id = None
     try:
-        nurse_email = get_nurse_email()
-        send_nurse_notification(nurse_email, patient)
-        print(f"✅ Nurse notification sent for patient {patient_id}")
+        notification_id = enqueue_nurse_notification(get_nurse_email(), patient)
+        print(f"📬 Nurse notification queued for patient {patient_id}")
     except Exception as e:
-        print(f"⚠️ Failed to send nurse notification: {e}")
+        print(f"⚠️ Failed to queue nurse notification: {e}")
     
-    return {"message": "Patient approved for discharge", "status": "doctor_approved"}
+    return {"message": "Patient approved for discharge", "status": "doctor_approved", "notification_id": notification_id}
 
 # ==================== DISCHARGE DETECTION ====================
 
 @app.post("/api/run-discharge-detection")
-def run_discharge_detection():
-    """Run the discharge readiness detection workflow"""
+def run_discharge_detection(mode: str = "async", concurrency: Optional[int] = None, full_rescan: bool = False):
+    """Queue a discharge readiness detection run and return its job id"""
+    if mode not in EXECUTION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(EXECUTION_MODES)}")
+    if concurrency is not None and concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+    if detection_running():
+        raise HTTPException(status_code=409, detail="A discharge detection run is already in progress")
+    
     try:
-        # Execute LangGraph workflow
-        result = discharge_workflow.invoke({"input": "start_detection"})
-        
-        return {
-            "status": "completed",
-            "ready_patients": result.get("ready_patients", []),
-            "processed_count": result.get("processed_count", 0),
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        job_id = start_job({
+            "execution_mode": mode,
+            "concurrency": concurrency,
+            "full_rescan": full_rescan
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Workflow failed: {str(e)}")
+    
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "job_url": f"/api/detection-jobs/{job_id}",
+        "events_url": f"/api/detection-jobs/{job_id}/events",
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+@app.get("/api/detection-scheduler")
+def get_detection_scheduler():
+    """Scheduler configuration, last scheduled run and current lease holder"""
+    return {"scheduler": detection_scheduler.status(), "run_in_progress": detection_running()}
+
+@app.get("/api/detection-jobs/{job_id}")
+def get_detection_job(job_id: str):
+    """Get state and per-patient results of a detection job"""
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Detection job not found")
+    return {"job": job}
+
+@app.get("/api/detection-jobs/{job_id}/events")
+def stream_detection_job(job_id: str):
+    """Stream a detection job's per-patient results as Server-Sent Events"""
+    if not get_job(job_id, include_results=False):
+        raise HTTPException(status_code=404, detail="Detection job not found")
+    
+    return StreamingResponse(
+        stream_job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ==================== DISCHARGE LOGS ====================
 
@@ -139,29 +204,61 @@ def get_discharge_logs():
     logs = list(discharge_logs_collection.find({}, {"_id": 0}).sort("timestamp", -1).limit(50))
     return {"logs": logs}
 
+# ==================== CACHES ====================
+
+@app.get("/api/pdf-cache/stats")
+def get_pdf_cache_stats():
+    """Size and hit/miss counters for the rendered PDF cache"""
+    return {"pdf_cache": pdf_cache.stats()}
+
+@app.get("/api/llm-cache/stats")
+def get_llm_cache_stats():
+    """Hit/miss counters for the shared LLM response cache"""
+    from llm_cache import llm_cache
+    return {"stats": llm_cache.stats()}
+
 # ==================== NURSE TASKS ENDPOINTS ====================
 
 @app.get("/api/nurse-tasks")
 def get_all_nurse_tasks():
     """Get all patients approved by doctor (for nurse dashboard)"""
-    # Return all patients with status 'doctor_approved'
-    patients = list(patients_collection.find({"status": "doctor_approved"}, {"_id": 0}))
-    
-    # Attach checklist from nurse_tasks_collection
-    for p in patients:
-        checklist_doc = nurse_tasks_collection.find_one({"patient_id": p["patient_id"]}, {"_id": 0})
-        if checklist_doc:
-            p["pending_nurse_tasks"] = [t["label"] for t in checklist_doc.get("tasks", [])]
-            p["nurse_status"] = checklist_doc.get("status", "pending")
-        else:
-            p["pending_nurse_tasks"] = []
-            p["nurse_status"] = "pending"
-    
+    # One round-trip: patients joined with their checklist in the pipeline
+    patients = list(patients_collection.aggregate(nurse_dashboard_pipeline()))
     return {"patients": patients}
 
+# Checklists that may become the diagnosis template once a nurse edits them;
+# fallback and default lists are generic and never do
+TEMPLATE_SOURCES = ("template", "llm")
+
+def _store_checklist(patient_id, tasks, source):
+    nurse_tasks_collection.update_one(
+        {"patient_id": patient_id},
+        {
+            "$set": {
+                "tasks": [{"label": task, "completed": False, "completed_at": None} for task in tasks],
+                # What was served, so an unchanged submit is not saved as a nurse edit
+                "source": source,
+                "served_tasks": list(tasks),
+                "status": "pending",
+                "updated_at": datetime.utcnow()
+            },
+            "$setOnInsert": {"created_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+
+@app.get("/api/nurse-tasks/templates/stats")
+def get_checklist_template_stats():
+    """Checklist template library hit rate per diagnosis"""
+    from agents.nurse_agent import checklist_template_stats
+    return {"diagnoses": checklist_template_stats()}
+
 @app.get("/api/nurse-tasks/{patient_id}")
-def get_nurse_tasks_for_patient(patient_id: str):
-    """Get nurse tasks for a specific patient"""
+def get_nurse_tasks_for_patient(patient_id: str, refresh: bool = False):
+    """
+    Get nurse tasks for a specific patient. ?refresh=true regenerates the
+    checklist with AI instead of reusing the diagnosis template.
+    """
     patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -169,20 +266,14 @@ def get_nurse_tasks_for_patient(patient_id: str):
     # Check if checklist already exists
     checklist_doc = nurse_tasks_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     
-    if not checklist_doc:
-        # Generate checklist using AI
+    if not checklist_doc or refresh:
+        # Serve the diagnosis template, generating with AI on a miss
         try:
             from agents.nurse_agent import generate_nurse_checklist
-            tasks = generate_nurse_checklist(patient)
+            tasks, source = generate_nurse_checklist(patient, refresh=refresh)
             
             # Store generated checklist
-            nurse_tasks_collection.insert_one({
-                "patient_id": patient_id,
-                "tasks": [{"label": task, "completed": False, "completed_at": None} for task in tasks],
-                "status": "pending",
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            })
+            _store_checklist(patient_id, tasks, source)
             
             return {"tasks": tasks, "status": "pending"}
         except Exception as e:
@@ -195,13 +286,7 @@ def get_nurse_tasks_for_patient(patient_id: str):
                 "Collect discharge documentation"
             ]
             
-            nurse_tasks_collection.insert_one({
-                "patient_id": patient_id,
-                "tasks": [{"label": task, "completed": False, "completed_at": None} for task in default_tasks],
-                "status": "pending",
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            })
+            _store_checklist(patient_id, default_tasks, "default")
             
             return {"tasks": default_tasks, "status": "pending"}
     
@@ -216,6 +301,12 @@ def update_nurse_checklist(patient_id: str, data: dict):
     checked = data.get("checked", {})
     note = data.get("note", "")
     
+    previous = nurse_tasks_collection.find_one(
+        {"patient_id": patient_id}, {"_id": 0, "tasks": 1, "source": 1, "served_tasks": 1}
+    ) or {}
+    # Tasks added for this patient alone (via /add) stay out of the template
+    added = {t["label"] for t in previous.get("tasks", []) if t.get("added")}
+    
     # Build tasks with completion status
     tasks = []
     for idx, item in enumerate(checklist):
@@ -224,7 +315,8 @@ def update_nurse_checklist(patient_id: str, data: dict):
             "label": item,
             "completed": is_completed,
             "completed_by": "nurse" if is_completed else None,
-            "completed_at": datetime.utcnow() if is_completed else None
+            "completed_at": datetime.utcnow() if is_completed else None,
+            **({"added": True} if item in added else {})
         })
     
     # Determine if all tasks are completed
@@ -242,16 +334,20 @@ def update_nurse_checklist(patient_id: str, data: dict):
         upsert=True
     )
     
+    # Nurse edits become the checklist template for this diagnosis
+    edited = [item for item in checklist if item not in added]
+    if edited and previous.get("source") in TEMPLATE_SOURCES and edited != previous.get("served_tasks"):
+        patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0, "diagnosis": 1, "age": 1})
+        if patient:
+            from agents.nurse_agent import save_checklist_template
+            save_checklist_template(patient, edited, source="nurse_edit")
+    
     # Update patient status if all tasks completed
     if all_completed:
-        patients_collection.update_one(
-            {"patient_id": patient_id},
-            {"$set": {
-                "status": "nurse_completed",
-                "nurse_completed_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }}
-        )
+        update_patient_stage(patient_id, "nurse_completed", {
+            "nurse_completed_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        })
         
         # Log the completion
         discharge_logs_collection.insert_one({
@@ -278,7 +374,8 @@ def add_checklist_item(patient_id: str, data: dict):
             "tasks": {
                 "label": item,
                 "completed": False,
-                "completed_at": None
+                "completed_at": None,
+                "added": True
             }
         }},
         upsert=True
@@ -291,74 +388,117 @@ def add_checklist_item(patient_id: str, data: dict):
 @app.get("/api/pharmacy")
 def get_pharmacy_patients():
     """Get all patients ready for pharmacy (nurse completed)"""
-    patients = list(patients_collection.find({"status": "nurse_completed"}, {"_id": 0}))
-    
-    # Attach nurse notes
-    for p in patients:
-        nurse_tasks = nurse_tasks_collection.find_one({"patient_id": p["patient_id"]}, {"_id": 0})
-        if nurse_tasks:
-            p["nurse_notes"] = nurse_tasks.get("handover_note", "")
-    
+    patients = list(patients_collection.aggregate(pharmacy_queue_pipeline()))
     return {"patients": patients}
 
+def _prescription_etag(patient):
+    return f'"rx-{patient.get("prescription_draft_version", 0)}-{(patient.get("prescription_draft_fingerprint") or "none")[:16]}"'
+
+def _draft_is_current(patient, fingerprint):
+    return bool(patient.get("prescription_draft")) and patient.get("prescription_draft_fingerprint") == fingerprint
+
+def _etag_matches(etag, if_none_match):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _save_prescription_draft(patient_id, text, fingerprint):
+    """Store a new draft version; returns the updated patient document"""
+    return patients_collection.find_one_and_update(
+        {"patient_id": patient_id},
+        {
+            "$set": {
+                "prescription_draft": text,
+                "prescription_draft_fingerprint": fingerprint,
+                "prescription_draft_generated_at": datetime.utcnow()
+            },
+            "$inc": {"prescription_draft_version": 1}
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
 @app.get("/api/pharmacy/{patient_id}")
-def get_pharmacy_prescription(patient_id: str):
-    """Get or generate pharmacy prescription for patient"""
+def get_pharmacy_prescription(patient_id: str, response: Response, regenerate: bool = False,
+                              if_none_match: Optional[str] = Header(None)):
+    """
+    Get or generate pharmacy prescription for patient. The stored draft is
+    returned (with an ETag) while the clinical fields and nurse handover note
+    are unchanged; ?regenerate=true forces a new draft.
+    """
     patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
     # Get nurse notes
     nurse_tasks = nurse_tasks_collection.find_one({"patient_id": patient_id}, {"_id": 0})
-    
-    # Generate prescription using AI
-    try:
-        from agents.pharmacy_agent import generate_prescription
-        prescription = generate_prescription(patient, nurse_tasks)
-        
-        return {
-            "prescription": prescription,
-            "patient": patient,
-            "nurse_notes": nurse_tasks.get("handover_note", "") if nurse_tasks else ""
-        }
-    except Exception as e:
-        # Fallback to basic prescription
-        return {
-            "prescription": f"""
-PRESCRIPTION FOR {patient['name']}
-Patient ID: {patient['patient_id']}
-Diagnosis: {patient['diagnosis']}
-
-MEDICATIONS:
-- Medication as prescribed by doctor
-- Follow dosage instructions carefully
-
-INSTRUCTIONS:
-- Take medications with food
-- Complete full course of treatment
-- Report any side effects
+    nurse_notes = nurse_tasks.get("handover_note", "") if nurse_tasks else ""
+    
+    fingerprint = clinical_fingerprint(patient, nurse_notes)
+    cached = not regenerate and _draft_is_current(patient, fingerprint)
+    
+    if not cached:
+        from agents.pharmacy_agent import generate_ai_prescription, generate_fallback_prescription
+        prescription = generate_ai_prescription(patient, nurse_tasks)
+        if prescription is None:
+            # Never treat the fallback as current so the next request retries the agent
+            prescription = generate_fallback_prescription(patient).strip()
+            fingerprint = None
+        patient = _save_prescription_draft(patient_id, prescription, fingerprint) or patient
+    
+    etag = _prescription_etag(patient)
+    if cached and _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    return {
+        "prescription": patient["prescription_draft"],
+        "version": patient.get("prescription_draft_version", 0),
+        "cached": cached,
+        "patient": patient,
+        "nurse_notes": nurse_notes
+    }
 
-FOLLOW-UP:
-- Schedule appointment in 1 week
-            """.strip(),
-            "patient": patient,
-            "nurse_notes": nurse_tasks.get("handover_note", "") if nurse_tasks else ""
-        }
+@app.get("/api/pharmacy/{patient_id}/stream")
+def stream_pharmacy_prescription(patient_id: str, regenerate: bool = False):
+    """Stream the AI-generated prescription token by token, saving the draft once complete"""
+    patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    nurse_tasks = nurse_tasks_collection.find_one({"patient_id": patient_id}, {"_id": 0})
+    nurse_notes = nurse_tasks.get("handover_note", "") if nurse_tasks else ""
+    
+    fingerprint = clinical_fingerprint(patient, nurse_notes)
+    if not regenerate and _draft_is_current(patient, fingerprint):
+        return StreamingResponse(
+            iter([patient["prescription_draft"]]),
+            media_type="text/plain",
+            headers={"ETag": _prescription_etag(patient)}
+        )
+    
+    from agents.pharmacy_agent import stream_prescription, generate_fallback_prescription
+    return StreamingResponse(
+        _stream_text(
+            stream_prescription(patient, nurse_tasks),
+            lambda text, fell_back: _save_prescription_draft(patient_id, text, None if fell_back else fingerprint),
+            fallback=lambda: generate_fallback_prescription(patient).strip()
+        ),
+        media_type="text/plain",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/pharmacy/{patient_id}/complete")
 def complete_pharmacy_prescription(patient_id: str, data: dict):
     """Mark pharmacy prescription as completed"""
     prescription = data.get("prescription", {})
     
-    patients_collection.update_one(
-        {"patient_id": patient_id},
-        {"$set": {
-            "status": "pharmacy_completed",
-            "prescription": prescription,
-            "pharmacy_completed_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }}
-    )
+    update_patient_stage(patient_id, "pharmacy_completed", {
+        "prescription": prescription,
+        "pharmacy_completed_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    })
     
     # Log the completion
     discharge_logs_collection.insert_one({
@@ -371,8 +511,27 @@ def complete_pharmacy_prescription(patient_id: str, data: dict):
     
     return {"success": True, "message": "Prescription completed"}
 
+def _pdf_response(if_none_match, filename, kind, *args):
+    """
+    Serve a rendered document with a content-addressed ETag: a matching
+    If-None-Match gets a 304, otherwise the PDF comes from the disk cache or
+    the render pool (503 when the render queue is saturated).
+    """
+    etag = document_etag(document_key(kind, *args))
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        _, pdf = get_or_render(kind, *args)
+    except PdfQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+    return Response(
+        content=pdf,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename={filename}", "ETag": etag}
+    )
+
 @app.get("/api/patients/{patient_id}/download-prescription")
-def download_prescription_pdf(patient_id: str):
+def download_prescription_pdf(patient_id: str, if_none_match: Optional[str] = Header(None)):
     """Download prescription as PDF"""
     patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     if not patient:
@@ -382,34 +541,7 @@ def download_prescription_pdf(patient_id: str):
     if isinstance(prescription, dict):
         prescription = str(prescription)
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    title_style = ParagraphStyle('Title', parent=styles['Title'], fontSize=20, textColor=colors.HexColor('#f59e0b'))
-    story.append(Paragraph(f"Prescription - {patient['name']}", title_style))
-    story.append(Spacer(1, 0.3*inch))
-    
-    story.append(Paragraph(f"<b>Patient ID:</b> {patient['patient_id']}", styles['Normal']))
-    story.append(Paragraph(f"<b>Date:</b> {datetime.utcnow().strftime('%Y-%m-%d')}", styles['Normal']))
-    story.append(Spacer(1, 0.2*inch))
-    
-    for line in prescription.split('\n'):
-        if line.strip():
-            story.append(Paragraph(line.strip(), styles['Normal']))
-    
-    doc.build(story)
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=Prescription_{patient_id}.pdf"
-        }
-    )
+    return _pdf_response(if_none_match, f"Prescription_{patient_id}.pdf", "prescription", document_patient(patient), prescription, datetime.utcnow().strftime('%Y-%m-%d'))
 
 # ==================== SUMMARY ENDPOINTS ====================
 
@@ -424,29 +556,9 @@ def get_summary_patients():
     print(f"📊 Summary Portal: Found {len(patients)} patients")  # Debug log
     return {"patients": patients}
 
-@app.get("/api/patients/{patient_id}/summary")
-def get_patient_summary(patient_id: str):
-    """Get AI-generated discharge summary for patient"""
-    patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
-    if not patient:
-        raise HTTPException(status_code=404, detail="Patient not found")
-    
-    # Get nurse tasks and notes
-    nurse_tasks = nurse_tasks_collection.find_one({"patient_id": patient_id}, {"_id": 0})
-    
-    state = {
-        "patient": patient,
-        "nurse_notes": nurse_tasks.get("handover_note", "") if nurse_tasks else ""
-    }
-    
-    try:
-        from agents.summary_agent import summary_workflow
-        result = summary_workflow.invoke(state)
-        summary_text = result.get("summary", "")
-    except Exception as e:
-        print(f"⚠️ Summary generation failed: {e}")
-        # Fallback summary
-        summary_text = f"""
+def _fallback_summary(patient, nurse_notes):
+    """Template summary used when the summary agent is unavailable"""
+    return f"""
 DISCHARGE SUMMARY
 
 Patient Name: {patient['name']}
@@ -464,65 +576,118 @@ Vital Signs at Discharge:
 - Heart Rate: {patient['vital_signs']['heart_rate']} bpm
 - Temperature: {patient['vital_signs']['temperature']}°F
 
-Nurse Notes: {state.get('nurse_notes', 'None')}
+Nurse Notes: {nurse_notes}
 
 Follow-up: Schedule appointment in 1 week.
         """.strip()
-    
-    # ✅ UPDATE STATUS: Mark as summary_completed so it stays in the list
-    patients_collection.update_one(
-        {"patient_id": patient_id},
-        {"$set": {
-            "status": "summary_completed",
-            "summary": summary_text,
-            "summary_generated_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }}
-    )
-    
-    return {"summary": summary_text, "patient": patient}
 
-@app.get("/api/patients/{patient_id}/download-summary")
-def download_summary_pdf(patient_id: str):
-    """Download discharge summary as PDF"""
+def _stream_text(chunks, on_complete, fallback=None):
+    """
+    Forward text chunks to the client as they arrive and hand the full text to
+    on_complete(text, fell_back) once the stream finishes. If the source fails
+    before sending anything, the fallback text is sent and passed on instead.
+    """
+    parts = []
+    fell_back = False
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+    except Exception as e:
+        print(f"⚠️ Streaming generation failed: {e}")
+        if parts or fallback is None:
+            raise
+        parts = [fallback()]
+        fell_back = True
+        yield parts[0]
+    on_complete("".join(parts).strip(), fell_back)
+
+def _summary_is_current(patient, fingerprint):
+    return bool(patient.get("summary")) and patient.get("summary_fingerprint") == fingerprint
+
+def _save_summary(patient_id, summary_text, fingerprint):
+    # ✅ UPDATE STATUS: Mark as summary_completed so it stays in the list; a
+    # regeneration for a billed or discharged patient only refreshes the summary
+    update_patient_stage(patient_id, "summary_completed", {
+        "summary": summary_text,
+        "summary_fingerprint": fingerprint,
+        "summary_generated_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }, advance_only=True)
+
+@app.get("/api/patients/{patient_id}/summary")
+def get_patient_summary(patient_id: str, regenerate: bool = False):
+    """
+    Get AI-generated discharge summary for patient. The stored summary is
+    returned while the patient's clinical fields and handover note are
+    unchanged; ?regenerate=true forces a new generation.
+    """
     patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
-    summary = patient.get("summary", "Summary not available")
+    # Get nurse tasks and notes
+    nurse_tasks = nurse_tasks_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
+    state = {
+        "patient": patient,
+        "nurse_notes": nurse_tasks.get("handover_note", "") if nurse_tasks else ""
+    }
     
-    # Title
-    title_style = ParagraphStyle('Title', parent=styles['Title'], fontSize=20, textColor=colors.HexColor('#2563eb'))
-    story.append(Paragraph(f"Discharge Summary - {patient['name']}", title_style))
-    story.append(Spacer(1, 0.3*inch))
+    fingerprint = clinical_fingerprint(patient, state["nurse_notes"])
+    if not regenerate and _summary_is_current(patient, fingerprint):
+        return {"summary": patient["summary"], "patient": patient, "cached": True}
     
-    # Patient Info
-    story.append(Paragraph(f"<b>Patient ID:</b> {patient['patient_id']}", styles['Normal']))
-    story.append(Paragraph(f"<b>Diagnosis:</b> {patient['diagnosis']}", styles['Normal']))
-    story.append(Spacer(1, 0.2*inch))
+    try:
+        from agents.summary_agent import summary_workflow
+        result = summary_workflow.invoke(state)
+        summary_text = result.get("summary", "")
+    except Exception as e:
+        print(f"⚠️ Summary generation failed: {e}")
+        summary_text = _fallback_summary(patient, state["nurse_notes"])
+        # Never memoize the fallback so the next request retries the agent
+        fingerprint = None
     
-    # Summary
-    for line in summary.split('\n'):
-        if line.strip():
-            story.append(Paragraph(line.strip(), styles['Normal']))
+    _save_summary(patient_id, summary_text, fingerprint)
     
-    doc.build(story)
-    buffer.seek(0)
+    return {"summary": summary_text, "patient": patient, "cached": False}
+
+@app.get("/api/patients/{patient_id}/summary/stream")
+def stream_patient_summary(patient_id: str, regenerate: bool = False):
+    """Stream the AI-generated discharge summary token by token, saving it once complete"""
+    patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    nurse_tasks = nurse_tasks_collection.find_one({"patient_id": patient_id}, {"_id": 0})
+    nurse_notes = nurse_tasks.get("handover_note", "") if nurse_tasks else ""
     
+    fingerprint = clinical_fingerprint(patient, nurse_notes)
+    if not regenerate and _summary_is_current(patient, fingerprint):
+        return StreamingResponse(iter([patient["summary"]]), media_type="text/plain")
+    
+    from agents.summary_agent import stream_summary
     return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=Discharge_Summary_{patient_id}.pdf"
-        }
+        _stream_text(
+            stream_summary(patient),
+            lambda text, fell_back: _save_summary(patient_id, text, None if fell_back else fingerprint),
+            fallback=lambda: _fallback_summary(patient, nurse_notes)
+        ),
+        media_type="text/plain",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.get("/api/patients/{patient_id}/download-summary")
+def download_summary_pdf(patient_id: str, if_none_match: Optional[str] = Header(None)):
+    """Download discharge summary as PDF"""
+    patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    summary = patient.get("summary", "Summary not available")
+    
+    return _pdf_response(if_none_match, f"Discharge_Summary_{patient_id}.pdf", "summary", document_patient(patient), summary)
+
 # ==================== BILLING ENDPOINTS ====================
 
 @app.get("/api/billing")
@@ -536,6 +701,38 @@ def get_billing_patients():
     print(f"💰 Billing Portal: Found {len(patients)} patients")  # Debug log
     return {"patients": patients}
 
+@app.get("/api/billing/projection")
+def get_revenue_projection():
+    """Projected revenue if every current inpatient were billed today"""
+    from agents.billing_agent import calculate_bills
+    from tariffs import get_tariffs
+    patients = list(patients_collection.find(
+        {
+            "status": {"$nin": ["billing_completed", "discharge_complete"]},
+            "admission_date": {"$exists": True}
+        },
+        {"_id": 0, "patient_id": 1, "name": 1, "diagnosis": 1, "diagnosis_category": 1, "ward": 1, "admission_date": 1}
+    ))
+    # Patients with a bad admission_date are left out and listed, not fatal
+    skipped = []
+    billed = [(patient, bill) for patient, bill in zip(patients, calculate_bills(patients, errors=skipped)) if bill]
+    bills = [bill for _, bill in billed]
+
+    by_category = {}
+    for patient, bill in billed:
+        category = diagnosis_category(patient)
+        entry = by_category.setdefault(category, {"patients": 0, "revenue": 0.0})
+        entry["patients"] += 1
+        entry["revenue"] = round(entry["revenue"] + bill["total_amount"], 2)
+
+    return {
+        "patients": len(bills),
+        "projected_revenue": round(sum(bill["total_amount"] for bill in bills), 2),
+        "by_category": by_category,
+        "currency": get_tariffs().currency,
+        "skipped": skipped
+    }
+
 @app.post("/api/billing/{patient_id}/generate")
 def generate_billing(patient_id: str):
     """Generate bill for patient"""
@@ -549,14 +746,17 @@ def generate_billing(patient_id: str):
         bill = calculate_bill(patient)
     except Exception as e:
         print(f"⚠️ Billing agent failed: {e}")
-        # Fallback billing calculation
+        # Fallback billing calculation: ward charges only, no diagnosis package
         from datetime import datetime as dt
+        from tariffs import get_tariffs
+        tariffs = get_tariffs()
+        tariff = tariffs.lookup("general", patient.get("ward"))
         admission_date = dt.strptime(patient["admission_date"], "%Y-%m-%d")
         days_stayed = max((dt.utcnow() - admission_date).days, 1)  # Minimum 1 day
         
-        room_charges = 500 * days_stayed
-        doctor_charges = 200
-        prescription_cost = 150
+        room_charges = tariff.room_per_day * days_stayed
+        doctor_charges = tariff.doctor_consultation
+        prescription_cost = tariff.prescription_cost
         total = room_charges + doctor_charges + prescription_cost
         
         bill = {
@@ -571,25 +771,25 @@ def generate_billing(patient_id: str):
                 "prescription_cost": prescription_cost
             },
             "total_amount": total,
-            "currency": "USD"
+            "currency": tariffs.currency,
+            "currency_symbol": tariffs.currency_symbol,
+            "tariff_version": tariffs.version
         }
     
     # Update patient with bill
-    patients_collection.update_one(
-        {"patient_id": patient_id},
-        {"$set": {
-            "status": "billing_completed",
-            "bill": bill,
-            "billing_completed_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }}
-    )
+    previous = update_patient_stage(patient_id, "billing_completed", {
+        "bill": bill,
+        "billing_completed_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    })
+    if previous is not None:
+        record_bill(previous, bill, previous.get("bill"))
     
     # Log billing completion
     discharge_logs_collection.insert_one({
         "patient_id": patient_id,
         "action": "billing_completed",
-        "details": f"Bill generated for patient {patient_id}. Total: ${bill['total_amount']}",
+        "details": f"Bill generated for patient {patient_id}. Total: {bill.get('currency_symbol', '₹')}{bill['total_amount']}",
         "agent": "Billing",
         "timestamp": datetime.utcnow()
     })
@@ -620,21 +820,18 @@ def complete_billing_and_notify(patient_id: str):
             {"patient_id": patient_id},
             {"$set": {"bill": bill}}
         )
+        record_bill(patient, bill)
     
 
     # Mark as fully completed
-    patients_collection.update_one(
-        {"patient_id": patient_id},
-        {"$set": {
-            "status": "discharge_complete",
-            "discharge_completed_at": datetime.utcnow()
-        }}
-    )
+    update_patient_stage(patient_id, "discharge_complete", {
+        "discharge_completed_at": datetime.utcnow()
+    })
     
     return {"success": True, "message": "Discharge completed and guardian notified", "bill": bill}
 
 @app.get("/api/patients/{patient_id}/download-bill")
-def download_bill_pdf(patient_id: str):
+def download_bill_pdf(patient_id: str, if_none_match: Optional[str] = Header(None)):
     """Download bill as PDF"""
     patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     if not patient:
@@ -645,66 +842,14 @@ def download_bill_pdf(patient_id: str):
         from agents.billing_agent import calculate_bill
         bill = calculate_bill(patient)
     
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    title_style = ParagraphStyle('Title', parent=styles['Title'], fontSize=20, textColor=colors.HexColor('#dc2626'))
-    story.append(Paragraph("INVOICE", title_style))
-    story.append(Paragraph("St. Jude's Medical Center", styles['Heading2']))
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Patient & Bill Info
-    info_data = [
-        ["Patient Name:", patient['name']],
-        ["Patient ID:", patient['patient_id']],
-        ["Admission Date:", bill['admission_date']],
-        ["Discharge Date:", bill['discharge_date']],
-        ["Days Stayed:", f"{bill['days_stayed']} days"]
-    ]
-    info_table = Table(info_data)
-    story.append(info_table)
-    story.append(Spacer(1, 0.3*inch))
-    
-    # Bill breakdown
-    bill_data = [
-        ["Description", "Amount (₹)"],
-        ["Room Charges", f"₹{bill['breakdown']['room_charges']:,.2f}"],
-        ["Doctor Charges", f"₹{bill['breakdown']['doctor_charges']:,.2f}"],
-        ["Nursing Charges", f"₹{bill['breakdown'].get('nursing_charges', 0):,.2f}"],
-        ["Prescription Cost", f"₹{bill['breakdown']['prescription_cost']:,.2f}"],
-        ["Additional Charges", f"₹{bill['breakdown'].get('additional_charges', 0):,.2f}"],
-        ["Subtotal", f"₹{bill['breakdown'].get('subtotal', 0):,.2f}"],
-        ["GST (18%)", f"₹{bill['breakdown'].get('gst_18_percent', 0):,.2f}"],
-        ["TOTAL AMOUNT", f"₹{bill['total_amount']:,.2f}"]
-    ]
-    
-    bill_table = Table(bill_data, colWidths=[4*inch, 2*inch])
-    bill_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fee2e2')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    story.append(bill_table)
-    
-    doc.build(story)
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename=Bill_{patient_id}.pdf"
-        }
-    )
+    return _pdf_response(if_none_match, f"Bill_{patient_id}.pdf", "bill", document_patient(patient), bill)
 
 @app.post("/api/billing/{patient_id}/send-to-guardian")
 def send_documents_to_guardian(patient_id: str):
-    """Send discharge documents to guardian via email"""
+    """
+    Queue the discharge documents for email to the guardian. The patient moves
+    to discharge_complete once the outbox confirms delivery.
+    """
     patient = patients_collection.find_one({"patient_id": patient_id}, {"_id": 0})
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
@@ -721,44 +866,95 @@ def send_documents_to_guardian(patient_id: str):
             {"patient_id": patient_id},
             {"$set": {"bill": bill}}
         )
+        record_bill(patient, bill)
     
-    # Send email with PDF
+    # Queue email with PDF
     guardian_email = patient.get("guardian_email")
     if not guardian_email:
         raise HTTPException(status_code=400, detail="Guardian email not found")
     
-    try:
-        from email_service import send_discharge_summary_to_guardian
-        success = send_discharge_summary_to_guardian(
-            guardian_email, patient, summary, prescription, bill
-        )
-        
-        if success:
-            # Update patient status
-            patients_collection.update_one(
-                {"patient_id": patient_id},
-                {"$set": {
-                    "status": "discharge_complete",
-                    "guardian_notified_at": datetime.utcnow()
-                }}
-            )
-            
-            # Log the action
-            discharge_logs_collection.insert_one({
-                "patient_id": patient_id,
-                "action": "guardian_notified",
-                "details": f"Discharge documents sent to {guardian_email}",
-                "agent": "System",
-                "timestamp": datetime.utcnow()
-            })
-            
-            return {"success": True, "message": "Documents sent successfully to guardian"}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to send email")
-            
-    except Exception as e:
-        print(f"❌ Error sending to guardian: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    email_id = enqueue_guardian_packet(guardian_email, patient, summary, prescription, bill)
+    return {"success": True, "message": "Documents queued for delivery to guardian", "email_id": email_id}
+
+# ==================== EMAIL OUTBOX ====================
+
+@app.get("/api/email/outbox")
+def get_email_outbox(status: Optional[str] = None, patient_id: Optional[str] = None, limit: int = 50):
+    """Queue counts, worker state and the most recent messages (optionally filtered)"""
+    if status and status not in OUTBOX_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(OUTBOX_STATUSES)}")
+    
+    query = {}
+    if status:
+        query["status"] = status
+    if patient_id:
+        query["patient_id"] = patient_id
+    
+    # Attachment inputs and template context are bulky and only the workers need them
+    messages = list(email_outbox_collection.find(query, {"context": 0, "attachment.args": 0})
+                    .sort("created_at", -1).limit(min(max(limit, 1), 500)))
+    for message in messages:
+        message["email_id"] = message.pop("_id")
+    
+    return {"counts": outbox_counts(), "workers": email_outbox.status(), "messages": messages}
+
+@app.post("/api/email/outbox/{email_id}/retry")
+def retry_email(email_id: str):
+    """Send a dead-lettered message again"""
+    message = requeue(email_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="No dead-lettered email with that id")
+    email_outbox.notify()
+    message["email_id"] = message.pop("_id")
+    return {"message": "Email queued for retry", "email": message}
+
+def _validate_day_bounds(start, end):
+    for value in (start, end):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+
+# ==================== EXPORTS ====================
+
+@app.get("/api/exports/discharge-packets")
+def export_discharge_packets(start: Optional[str] = None, end: Optional[str] = None, status: Optional[str] = None):
+    """
+    Stream a ZIP of summary, prescription and bill PDFs for every patient
+    discharged between start and end (YYYY-MM-DD, inclusive). `status` is a
+    comma-separated list; defaults to billed and discharged patients.
+    """
+    _validate_day_bounds(start, end)
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else None
+    
+    from packet_export import stream_discharge_packets, export_query
+    filename = f"discharge_packets_{start or 'all'}_{end or 'all'}.zip"
+    return StreamingResponse(
+        stream_discharge_packets(export_query(start, end, statuses)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# ==================== ANALYTICS ====================
+
+@app.get("/api/analytics/revenue")
+def get_revenue_analytics(start: Optional[str] = None, end: Optional[str] = None):
+    """Billed revenue by day and diagnosis category (YYYY-MM-DD bounds, inclusive)"""
+    _validate_day_bounds(start, end)
+    return revenue_report(start, end)
+
+@app.get("/api/analytics/census")
+def get_census_analytics():
+    """Current patient counts by workflow status and diagnosis category"""
+    return census_report()
+
+@app.post("/api/analytics/rebuild")
+def rebuild_analytics():
+    """Recompute the revenue and census rollups from the patients collection"""
+    rebuild_rollups()
+    return {"revenue": revenue_report(), "census": census_report()}
+
 # ==================== RUN SERVER ====================
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+"""
+Census billing: calculate_bill per patient vs. the vectorized calculate_bills.
+Checks that both produce identical bills before timing.
+
+Run from the backend directory:
+    python benchmarks/bench_billing.py [n_patients]   # default 100000
+"""
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.billing_agent import calculate_bill, calculate_bills
+
+DIAGNOSES = [
+    "Acute Myocardial Infarction", "Stroke Rehab", "Fractured Femur", "Acute Appendicitis",
+    "Pneumonia", "COPD", "Type 2 Diabetes", "Gallstones", "Heart Valve Replacement", "Migraine"
+]
+
+def synthetic_census(n, now):
+    rng = random.Random(42)
+    return [{
+        "patient_id": f"BENCH{i:06d}",
+        "name": f"Patient {i}",
+        "diagnosis": rng.choice(DIAGNOSES),
+        "admission_date": (now - timedelta(days=rng.randint(0, 60))).strftime("%Y-%m-%d")
+    } for i in range(n)]
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    now = datetime.utcnow()
+    census = synthetic_census(n, now)
+
+    scalar, scalar_s = timed(lambda: [calculate_bill(p, now) for p in census])
+    batch, batch_s = timed(lambda: calculate_bills(census, now))
+
+    mismatches = sum(1 for a, b in zip(scalar, batch) if a != b)
+    print(f"patients:            {n}")
+    print(f"calculate_bill loop: {scalar_s:.3f}s ({scalar_s / n * 1e6:.1f} µs/patient)")
+    print(f"calculate_bills:     {batch_s:.3f}s ({batch_s / n * 1e6:.1f} µs/patient)")
+    print(f"speedup:             {scalar_s / batch_s:.1f}x")
+    print(f"census revenue:      ₹{sum(b['total_amount'] for b in batch):,.2f}")
+    print(f"mismatched bills:    {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
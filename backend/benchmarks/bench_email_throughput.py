@@ -0,0 +1,117 @@
+"""
+End-to-end email throughput through email_service against an in-process
+aiosmtpd sink (smtp_sink.py), so send performance can be measured and compared
+offline instead of through Gmail. Two workloads at several concurrency levels:
+
+  nurse     send_nurse_notification: HTML only
+  guardian  send_discharge_summary_to_guardian: HTML + discharge packet PDF,
+            a distinct patient per message so every PDF is rendered, not cached
+
+Reports messages/sec and p50/p99 per-message latency, plus SMTP sessions opened.
+The sink adds RTT per SMTP command and HANDSHAKE per session to stand in for a
+remote relay's STARTTLS + AUTH. SMTP_POOL_SIZE and PDF_WORKERS size the pools
+as they do in the app.
+
+Run from the backend directory (needs aiosmtpd):
+    python benchmarks/bench_email_throughput.py [messages] [concurrency,...] [rtt_ms] [handshake_ms]   # default 120 1,4,16 2 40
+"""
+import contextlib
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smtp_sink import start_sink
+
+SUMMARY = "\n".join(f"Clinical course line {i}: patient stable, vitals within range, tolerating diet." for i in range(40))
+PRESCRIPTION = "\n".join(f"{i}. Medication {i} - 10mg - Once daily - 30 days" for i in range(1, 15))
+
+def patient(i):
+    return {
+        "patient_id": f"BENCH{i:06d}",
+        "name": f"Bench Patient {i}",
+        "age": 40 + i % 50,
+        "diagnosis": "Acute Myocardial Infarction",
+        "admission_date": "2025-09-20",
+        "treatment_status": "stable",
+        "vital_signs": {"blood_pressure": "120/80", "heart_rate": 72, "temperature": 98.6, "oxygen_saturation": 98},
+        "guardian_email": f"guardian{i}@example.com"
+    }
+
+def run(label, send, messages, concurrency, offset, handler):
+    def timed(i):
+        start = time.perf_counter()
+        ok = send(i + offset)
+        return ok, time.perf_counter() - start
+    
+    sessions_before, received_before = handler.sessions, handler.messages
+    start = time.perf_counter()
+    # email_service prints a line per message; keep it out of the table
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(timed, range(messages)))
+    elapsed = time.perf_counter() - start
+    
+    failed = sum(1 for ok, _ in results if not ok)
+    received = handler.messages - received_before
+    latencies = sorted(latency for _, latency in results)
+    # Nearest rank: the smallest value with at least 99% of samples at or below it
+    p99 = latencies[math.ceil(len(latencies) * 99 / 100) - 1]
+    print(f"{label:<9} {concurrency:>4}   {messages / elapsed:>8.1f} msgs/s   "
+          f"p50 {statistics.median(latencies) * 1000:>7.1f} ms  p99 {p99 * 1000:>7.1f} ms   "
+          f"{handler.sessions - sessions_before:>4} sessions"
+          + (f"   {failed} FAILED" if failed else "")
+          + (f"   sink got {received}" if received != messages - failed else ""))
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 120
+    levels = [int(n) for n in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 4, 16]
+    rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.002
+    handshake = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.040
+    
+    controller, handler = start_sink(rtt, handshake)
+    # email_service reads its SMTP settings at import, so point it at the sink first
+    os.environ.update({
+        "SMTP_SERVER": controller.hostname,
+        "SMTP_PORT": str(controller.port),
+        "SMTP_STARTTLS": "false",
+        "SENDER_APP_PASSWORD": "",
+        "PDF_CACHE_DIR": tempfile.mkdtemp(prefix="bench_pdf_cache_")
+    })
+    import email_service
+    import pdf_service
+    from agents.billing_agent import calculate_bill
+    
+    bill = calculate_bill(patient(0))
+    # Start the PDF workers before timing so spawn cost is not counted
+    pdf_service.render_pdf("summary", patient(0), SUMMARY)
+    
+    def nurse(i):
+        return email_service.send_nurse_notification("nurse@example.com", patient(i))
+    
+    def guardian(i):
+        p = patient(i)
+        return email_service.send_discharge_summary_to_guardian(p["guardian_email"], p, SUMMARY, PRESCRIPTION, bill)
+    
+    print(f"{messages} messages per run, rtt {rtt * 1000:.0f} ms, handshake {handshake * 1000:.0f} ms, "
+          f"SMTP pool {email_service.smtp_pool.size}, {pdf_service.PDF_WORKERS} PDF workers")
+    print(f"{'workload':<9} {'conc':>4}")
+    try:
+        offset = 0
+        for label, send in (("nurse", nurse), ("guardian", guardian)):
+            for concurrency in levels:
+                run(label, send, messages, concurrency, offset, handler)
+                offset += messages
+    finally:
+        email_service.smtp_pool.close()
+        pdf_service.shutdown_pdf_pool()
+        controller.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Nurse and pharmacy list latency: per-patient find_one (the old N+1 path) vs.
+the single $lookup aggregation. Seeds a separate database so the app's data
+is never touched.
+
+Run from the backend directory against a live MongoDB (MONGO_URL):
+    python benchmarks/bench_list_endpoints.py [sizes...]   # default 10 1000 50000
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient, ASCENDING
+
+from database import MONGO_URL, nurse_dashboard_pipeline, pharmacy_queue_pipeline
+
+BENCH_DATABASE = os.getenv("BENCH_DATABASE", "mediflow_ai_bench")
+REPEATS = 3
+BATCH = 5000
+
+def seed(db, n):
+    """n patients on the nurse dashboard and n in the pharmacy queue"""
+    db.patients.drop()
+    db.nurse_tasks.drop()
+    db.patients.create_index([("patient_id", ASCENDING)])
+    db.patients.create_index([("status", ASCENDING)])
+    db.nurse_tasks.create_index([("patient_id", ASCENDING)])
+    total = 2 * n
+    for start in range(0, total, BATCH):
+        ids = range(start, min(start + BATCH, total))
+        db.patients.insert_many([{
+            "patient_id": f"BENCH{i:06d}",
+            "name": f"Patient {i}",
+            "age": 20 + i % 70,
+            "diagnosis": "Pneumonia",
+            "photo_url": f"https://randomuser.me/api/portraits/men/{i % 99}.jpg",
+            "vital_signs": {"blood_pressure": "120/80", "heart_rate": 75, "temperature": 98.6,
+                            "respiratory_rate": 16, "oxygen_saturation": 98},
+            "status": "doctor_approved" if i % 2 == 0 else "nurse_completed"
+        } for i in ids])
+        db.nurse_tasks.insert_many([{
+            "patient_id": f"BENCH{i:06d}",
+            "tasks": [{"label": f"Task {t}", "completed": False, "completed_at": None} for t in range(7)],
+            "status": "pending",
+            "handover_note": "Stable, ready for pharmacy review"
+        } for i in ids])
+
+def nurse_n_plus_one(db):
+    patients = list(db.patients.find({"status": "doctor_approved"}, {"_id": 0}))
+    for p in patients:
+        checklist_doc = db.nurse_tasks.find_one({"patient_id": p["patient_id"]}, {"_id": 0})
+        if checklist_doc:
+            p["pending_nurse_tasks"] = [t["label"] for t in checklist_doc.get("tasks", [])]
+            p["nurse_status"] = checklist_doc.get("status", "pending")
+        else:
+            p["pending_nurse_tasks"] = []
+            p["nurse_status"] = "pending"
+    return patients
+
+def pharmacy_n_plus_one(db):
+    patients = list(db.patients.find({"status": "nurse_completed"}, {"_id": 0}))
+    for p in patients:
+        nurse_tasks = db.nurse_tasks.find_one({"patient_id": p["patient_id"]}, {"_id": 0})
+        if nurse_tasks:
+            p["nurse_notes"] = nurse_tasks.get("handover_note", "")
+    return patients
+
+def best_of(fn, db):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        rows = fn(db)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(rows)
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 1000, 50000]
+    client = MongoClient(MONGO_URL)
+    db = client[BENCH_DATABASE]
+
+    cases = [
+        ("nurse    N+1", nurse_n_plus_one),
+        ("nurse    $lookup", lambda d: list(d.patients.aggregate(nurse_dashboard_pipeline()))),
+        ("pharmacy N+1", pharmacy_n_plus_one),
+        ("pharmacy $lookup", lambda d: list(d.patients.aggregate(pharmacy_queue_pipeline()))),
+    ]
+
+    print(f"{'patients':>9}  {'endpoint':<18} {'rows':>7} {'best ms':>10}")
+    try:
+        for n in sizes:
+            seed(db, n)
+            for label, fn in cases:
+                elapsed, rows = best_of(fn, db)
+                print(f"{n:>9}  {label:<18} {rows:>7} {elapsed * 1000:>10.1f}")
+    finally:
+        client.drop_database(BENCH_DATABASE)
+
+if __name__ == "__main__":
+    main()
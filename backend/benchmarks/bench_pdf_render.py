@@ -0,0 +1,79 @@
+"""
+Concurrent PDF download throughput: ReportLab layout on the request threads
+(the old path) vs. the pdf_service process pool. While the renders run, a
+probe thread does a small amount of Python work every 10 ms, standing in for
+other endpoints; its latency shows how much the renders stall the server.
+
+Run from the backend directory:
+    python benchmarks/bench_pdf_render.py [downloads] [concurrency]   # default 200 16
+"""
+import math
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pdf_service
+from agents.billing_agent import calculate_bill
+
+PATIENT = {
+    "patient_id": "BENCH000001",
+    "name": "Bench Patient",
+    "age": 61,
+    "diagnosis": "Acute Myocardial Infarction",
+    "admission_date": "2025-09-20"
+}
+SUMMARY = "\n".join(f"Clinical course line {i}: patient stable, vitals within range, tolerating diet." for i in range(40))
+PRESCRIPTION = "\n".join(f"{i}. Medication {i} - 10mg - Once daily - 30 days" for i in range(1, 15))
+BILL = calculate_bill(PATIENT)
+
+JOBS = [
+    ("bill", (PATIENT, BILL)),
+    ("summary", (PATIENT, SUMMARY)),
+    ("prescription", (PATIENT, PRESCRIPTION, "2025-10-01")),
+    ("discharge", (PATIENT, SUMMARY, PRESCRIPTION, BILL))
+]
+
+def probe(stop, latencies):
+    # Latency = time to wake from a 10 ms sleep and finish the work, minus the sleep
+    while not stop.is_set():
+        start = time.perf_counter()
+        time.sleep(0.01)
+        sum(i * i for i in range(2000))
+        latencies.append(time.perf_counter() - start - 0.01)
+
+def run(label, render, downloads, concurrency):
+    stop, latencies = threading.Event(), []
+    prober = threading.Thread(target=probe, args=(stop, latencies))
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        sizes = list(pool.map(lambda i: len(render(*JOBS[i % len(JOBS)])), range(downloads)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    latencies.sort()
+    # Nearest rank: the smallest value with at least 99% of samples at or below it
+    p99 = latencies[math.ceil(len(latencies) * 99 / 100) - 1] if latencies else 0
+    print(f"{label:<14} {downloads / elapsed:>8.1f} PDFs/s   "
+          f"probe p50 {statistics.median(latencies) * 1000:>6.2f} ms  p99 {p99 * 1000:>7.2f} ms   "
+          f"({sum(sizes) / 1024:.0f} KiB)")
+
+def main():
+    downloads = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    print(f"{downloads} downloads, {concurrency} concurrent, {pdf_service.PDF_WORKERS} pool workers")
+
+    run("request thread", lambda kind, args: pdf_service.BUILDERS[kind](*args), downloads, concurrency)
+    # Start the workers before timing so spawn cost is not counted
+    pdf_service.render_pdf("bill", PATIENT, BILL)
+    run("process pool", lambda kind, args: pdf_service.render_pdf(kind, *args), downloads, concurrency)
+    pdf_service.shutdown_pdf_pool()
+
+if __name__ == "__main__":
+    main()
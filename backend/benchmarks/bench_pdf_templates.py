@@ -0,0 +1,74 @@
+"""
+Per-document render time and allocations for the pdf_templates builders, plus
+the per-request style setup they no longer repeat (a fresh sample stylesheet
+and the document's ParagraphStyle/TableStyle objects, as the old builders
+constructed on every render).
+
+Run from the backend directory:
+    python benchmarks/bench_pdf_templates.py [renders]   # default 200
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import TableStyle
+
+import pdf_templates
+from agents.billing_agent import calculate_bill
+
+PATIENT = {
+    "patient_id": "BENCH000001",
+    "name": "Bench Patient",
+    "age": 61,
+    "diagnosis": "Acute Myocardial Infarction",
+    "admission_date": "2025-09-20"
+}
+SUMMARY = "\n".join(f"Clinical course line {i}: patient stable, vitals within range, tolerating diet." for i in range(40))
+PRESCRIPTION = "\n".join(f"{i}. Medication {i} - 10mg - Once daily - 30 days" for i in range(1, 15))
+BILL = calculate_bill(PATIENT)
+
+DOCUMENTS = [
+    ("summary", lambda: pdf_templates.build_summary(PATIENT, SUMMARY)),
+    ("prescription", lambda: pdf_templates.build_prescription(PATIENT, PRESCRIPTION, "2025-10-01")),
+    ("bill", lambda: pdf_templates.build_bill(PATIENT, BILL)),
+    ("discharge", lambda: pdf_templates.build_discharge_packet(PATIENT, SUMMARY, PRESCRIPTION, BILL)),
+]
+
+def per_request_styles():
+    """What every old builder paid before laying out a single line"""
+    styles = getSampleStyleSheet()
+    for name in ("Title", "Heading1", "Heading2", "Normal", "Normal"):
+        ParagraphStyle(f"Custom{name}", parent=styles[name], fontSize=10, textColor=colors.HexColor('#333333'))
+    TableStyle([('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'), ('GRID', (0, 0), (-1, -1), 1, colors.black)])
+
+def measure(fn, renders):
+    fn()  # warm fonts and caches
+    start = time.perf_counter()
+    for _ in range(renders):
+        fn()
+    per_call = (time.perf_counter() - start) / renders
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(max(stat.count_diff, 0) for stat in stats)
+    return per_call, blocks, peak
+
+def main():
+    renders = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'document':<22} {'ms/render':>10} {'new blocks':>11} {'peak KiB':>9}")
+    for name, fn in DOCUMENTS + [("style setup (removed)", per_request_styles)]:
+        per_call, blocks, peak = measure(fn, renders)
+        print(f"{name:<22} {per_call * 1000:>10.3f} {blocks:>11} {peak / 1024:>9.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Prompt rendering cost per patient: PromptTemplate built on every call (the
+old per-patient path) vs. the precompiled prompt registry.
+
+Run from the backend directory:
+    python benchmarks/bench_prompt_render.py [n_patients]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.prompts import PromptTemplate
+
+from agents.discharge_agent import READINESS_PROMPT, build_readiness_prompt
+
+DIAGNOSES = ["Acute Myocardial Infarction", "Pneumonia", "Type 2 Diabetes", "Stroke Rehab", "Acute Appendicitis", "COPD"]
+
+def synthetic_patients(n):
+    rng = random.Random(42)
+    return [{
+        "patient_id": f"BENCH{i:06d}",
+        "name": f"Patient {i}",
+        "age": rng.randint(18, 90),
+        "diagnosis": rng.choice(DIAGNOSES),
+        "vital_signs": {
+            "blood_pressure": f"{rng.randint(95, 160)}/{rng.randint(60, 100)}",
+            "heart_rate": rng.randint(55, 120),
+            "temperature": round(rng.uniform(97.0, 101.0), 1),
+            "respiratory_rate": rng.randint(12, 26),
+            "oxygen_saturation": rng.randint(88, 100)
+        },
+        "treatment_status": "completed"
+    } for i in range(n)]
+
+def render_with_prompt_template(patient):
+    prompt = PromptTemplate(input_variables=list(READINESS_PROMPT.variables), template=READINESS_PROMPT.template)
+    return prompt.format(
+        name=patient["name"],
+        age=patient["age"],
+        diagnosis=patient["diagnosis"],
+        vital_signs=patient["vital_signs"],
+        treatment_status=patient["treatment_status"]
+    )
+
+def timed(label, render, patients):
+    started = time.perf_counter()
+    outputs = [render(patient) for patient in patients]
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} total {elapsed * 1000:9.1f} ms   per patient {elapsed / len(patients) * 1e6:8.2f} µs")
+    return outputs, elapsed
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    patients = synthetic_patients(n)
+    print(f"📊 Rendering discharge readiness prompts for {n:,} patients\n")
+    
+    before, before_s = timed("PromptTemplate per call", render_with_prompt_template, patients)
+    after, after_s = timed("Prompt registry", build_readiness_prompt, patients)
+    
+    assert before == after, "Registry output differs from PromptTemplate output"
+    print(f"\n✅ Identical output, {before_s / after_s:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
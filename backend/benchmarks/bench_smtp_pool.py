@@ -0,0 +1,85 @@
+"""
+SMTP transport throughput: a fresh connection + handshake per message (the old
+send path) vs. the pooled SMTPPool, from threads and from asyncio, against the
+local sink in smtp_sink.py. The sink charges RTT per command and HANDSHAKE per
+session to stand in for a remote relay's STARTTLS + AUTH.
+
+Run from the backend directory (needs aiosmtpd):
+    python benchmarks/bench_smtp_pool.py [messages] [concurrency] [rtt_ms] [handshake_ms]   # default 400 8 2 40
+"""
+import asyncio
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smtp_pool import SMTPPool
+from smtp_sink import start_sink
+
+def message(i):
+    msg = MIMEText(f"<p>Discharge approval {i}</p>\n" * 50, "html")
+    msg["From"] = "bench@example.com"
+    msg["To"] = f"nurse{i}@example.com"
+    msg["Subject"] = f"Bench message {i}"
+    return msg
+
+def report(label, handler, messages, elapsed):
+    print(f"{label:<22} {messages / elapsed:>8.1f} msgs/s   {handler.sessions:>4} SMTP sessions")
+
+def run_fresh(host, port, handler, messages, concurrency):
+    def send(i):
+        server = smtplib.SMTP(host, port)
+        server.send_message(message(i))
+        server.quit()
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(messages)))
+    return time.perf_counter() - start
+
+def run_pooled(pool, messages, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        list(threads.map(lambda i: pool.send(message(i)), range(messages)))
+    return time.perf_counter() - start
+
+def run_async(pool, messages):
+    async def main():
+        await asyncio.gather(*(pool.send_async(message(i)) for i in range(messages)))
+    
+    start = time.perf_counter()
+    asyncio.run(main())
+    return time.perf_counter() - start
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.002
+    handshake = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0.040
+    print(f"{messages} messages, {concurrency} concurrent, rtt {rtt * 1000:.0f} ms, handshake {handshake * 1000:.0f} ms")
+
+    for label in ("connection per message", "SMTPPool (threads)", "SMTPPool (asyncio)"):
+        controller, handler = start_sink(rtt, handshake)
+        host, port = controller.hostname, controller.port
+        try:
+            if label == "connection per message":
+                elapsed = run_fresh(host, port, handler, messages, concurrency)
+            else:
+                pool = SMTPPool(host, port, starttls=False, size=concurrency)
+                if label == "SMTPPool (threads)":
+                    elapsed = run_pooled(pool, messages, concurrency)
+                else:
+                    elapsed = run_async(pool, messages)
+                pool.close()
+            assert handler.messages == messages, handler.messages
+            report(label, handler, messages, elapsed)
+        finally:
+            controller.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+In-process SMTP sink for the email benchmarks (needs `pip install aiosmtpd`).
+Accepts everything, keeps only counts, and can add a delay per command round
+trip plus a one-off session setup cost, so a local run shows what a remote
+relay's STARTTLS + AUTH handshake costs without sending real mail.
+"""
+import asyncio
+import socket
+import threading
+
+from aiosmtpd.controller import Controller
+
+class SinkHandler:
+    def __init__(self, rtt=0.0, handshake=0.0):
+        self.rtt = rtt
+        self.handshake = handshake
+        self.sessions = 0
+        self.messages = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    async def _round_trip(self, extra=0.0):
+        if self.rtt or extra:
+            await asyncio.sleep(self.rtt + extra)
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # A real relay would now negotiate TLS and authenticate
+        with self._lock:
+            self.sessions += 1
+        await self._round_trip(self.handshake)
+        session.host_name = hostname
+        return responses
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        await self._round_trip()
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return "250 OK"
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        await self._round_trip()
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        await self._round_trip()
+        with self._lock:
+            self.messages += 1
+            self.bytes += len(envelope.content)
+        return "250 Message accepted"
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_sink(rtt=0.0, handshake=0.0):
+    """(controller, handler) for a running sink; call controller.stop() when done"""
+    handler = SinkHandler(rtt, handshake)
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    return controller, handler
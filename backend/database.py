@@ -1,6 +1,7 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING
 from datetime import datetime
 import os
+from diagnosis_taxonomy import classify_diagnosis
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -19,10 +20,95 @@ db = client[DATABASE_NAME]
 patients_collection = db["patients"]
 discharge_logs_collection = db["discharge_logs"]
 nurse_tasks_collection = db["nurse_tasks"]
+workflow_state_collection = db["workflow_state"]
+llm_cache_collection = db["llm_cache"]
+detection_jobs_collection = db["detection_jobs"]
+leases_collection = db["leases"]
+checklist_templates_collection = db["checklist_templates"]
+revenue_rollups_collection = db["revenue_rollups"]
+census_rollups_collection = db["census_rollups"]
+email_outbox_collection = db["email_outbox"]
 
 def get_database():
     return db
 
+def init_indexes():
+    """Create the indexes the hot queries rely on (idempotent)"""
+    patients_collection.create_index([("patient_id", ASCENDING)])
+    patients_collection.create_index([
+        ("treatment_status", ASCENDING),
+        ("ready_for_discharge", ASCENDING),
+        ("updated_at", ASCENDING)
+    ])
+    # Mongo drops cached LLM responses once expires_at passes
+    llm_cache_collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+    llm_cache_collection.create_index([("created_at", ASCENDING)])
+    detection_jobs_collection.create_index([("created_at", ASCENDING)])
+    # $lookup from the nurse and pharmacy list pipelines joins on this
+    nurse_tasks_collection.create_index([("patient_id", ASCENDING)])
+    patients_collection.create_index([("status", ASCENDING)])
+    revenue_rollups_collection.create_index([("day", ASCENDING)])
+    # Outbox workers claim the oldest due message
+    email_outbox_collection.create_index([("status", ASCENDING), ("next_attempt_at", ASCENDING)])
+    email_outbox_collection.create_index([("patient_id", ASCENDING)])
+    # One pending message per recipient and template; enqueue_email upserts onto it
+    email_outbox_collection.create_index(
+        [("template", ASCENDING), ("to", ASCENDING), ("patient_id", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"status": "pending"}
+    )
+
+# Patient fields the nurse and pharmacy dashboards render
+DASHBOARD_FIELDS = ["patient_id", "name", "age", "diagnosis", "photo_url", "vital_signs"]
+
+def _checklist_lookup(status):
+    return [
+        {"$match": {"status": status}},
+        {"$lookup": {
+            "from": nurse_tasks_collection.name,
+            "localField": "patient_id",
+            "foreignField": "patient_id",
+            "as": "checklist"
+        }},
+        # First match only, like the per-patient find_one it replaces: $unwind
+        # would repeat a patient once per nurse_tasks document
+        {"$addFields": {"checklist": {"$ifNull": [{"$arrayElemAt": ["$checklist", 0]}, {}]}}}
+    ]
+
+def nurse_dashboard_pipeline():
+    """Doctor-approved patients with their checklist labels and nurse status"""
+    return _checklist_lookup("doctor_approved") + [
+        {"$project": {
+            "_id": 0,
+            **{field: 1 for field in DASHBOARD_FIELDS},
+            "pending_nurse_tasks": {"$ifNull": ["$checklist.tasks.label", []]},
+            "nurse_status": {"$ifNull": ["$checklist.status", "pending"]}
+        }}
+    ]
+
+def pharmacy_queue_pipeline():
+    """Nurse-completed patients with the nurse handover note"""
+    return _checklist_lookup("nurse_completed") + [
+        {"$project": {
+            "_id": 0,
+            **{field: 1 for field in DASHBOARD_FIELDS},
+            "nurse_notes": {"$ifNull": ["$checklist.handover_note", ""]}
+        }}
+    ]
+
+def backfill_diagnosis_categories():
+    """Store diagnosis_category on patients admitted before it was recorded"""
+    missing = {"diagnosis_category": {"$exists": False}}
+    updated = 0
+    for diagnosis in patients_collection.distinct("diagnosis", missing):
+        result = patients_collection.update_many(
+            {**missing, "diagnosis": diagnosis},
+            {"$set": {"diagnosis_category": classify_diagnosis(diagnosis)}}
+        )
+        updated += result.modified_count
+    if updated:
+        print(f"🏷️ Backfilled diagnosis category on {updated} patients")
+
 def get_nurse_email():
     return NURSE_EMAIL
 
@@ -241,5 +327,7 @@ def init_sample_data():
                 "photo_url": "https://randomuser.me/api/portraits/women/10.jpg"
             }
         ]
+        for patient in sample_patients:
+            patient["diagnosis_category"] = classify_diagnosis(patient["diagnosis"])
         patients_collection.insert_many(sample_patients)
         print(" Sample data initialized with 10 patients!")
\ No newline at end of file
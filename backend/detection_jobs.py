@@ -0,0 +1,204 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from database import detection_jobs_collection
+from leases import held_lease, get_lease
+
+# Detection runs are queued onto a small dedicated pool, off the request thread
+DETECTION_JOB_WORKERS = int(os.getenv("DETECTION_JOB_WORKERS", "1"))
+
+# Per-patient results are pushed to the job document in batches
+PROGRESS_FLUSH_EVERY = 20
+PROGRESS_FLUSH_SECONDS = 0.5
+
+SSE_POLL_SECONDS = 0.5
+
+# Only one detection run may execute at a time across all workers/replicas
+DETECTION_LEASE = "discharge_detection"
+DETECTION_LEASE_SECONDS = int(os.getenv("DETECTION_LEASE_SECONDS", "300"))
+
+FINISHED_STATUSES = ("done", "failed", "skipped")
+
+_executor = ThreadPoolExecutor(max_workers=DETECTION_JOB_WORKERS, thread_name_prefix="detection-job")
+
+class JobProgress:
+    """Collects per-patient results from a running workflow and appends them to the job document"""
+    
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def __call__(self, result):
+        with self._lock:
+            self.pending.append(result)
+            due = (len(self.pending) >= PROGRESS_FLUSH_EVERY
+                   or time.monotonic() - self.last_flush >= PROGRESS_FLUSH_SECONDS)
+        if due:
+            self.flush()
+    
+    def flush(self):
+        with self._lock:
+            results, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        if not results:
+            return
+        
+        ready = [r["patient_id"] for r in results if r["decision"] == "READY"]
+        errors = [{"patient_id": r["patient_id"], "error": r["error"]} for r in results if r["error"]]
+        detection_jobs_collection.update_one(
+            {"_id": self.job_id},
+            {
+                "$push": {
+                    "results": {"$each": results},
+                    "ready_patients": {"$each": ready},
+                    "errors": {"$each": errors}
+                },
+                "$inc": {"processed_count": len(results)},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+
+def create_job(params):
+    job_id = uuid.uuid4().hex
+    now = datetime.utcnow()
+    detection_jobs_collection.insert_one({
+        "_id": job_id,
+        "status": "queued",
+        "params": params,
+        "processed_count": 0,
+        "ready_patients": [],
+        "errors": [],
+        "results": [],
+        "created_at": now,
+        "updated_at": now
+    })
+    return job_id
+
+def detection_running():
+    """True while any worker holds the detection lease"""
+    return get_lease(DETECTION_LEASE) is not None
+
+def run_job(job_id, lease_held=False):
+    """
+    Execute the discharge workflow for a queued job, recording progress as it
+    goes. Takes the detection lease first unless the caller already holds it;
+    if another run holds it the job is marked skipped.
+    """
+    if not lease_held:
+        with held_lease(DETECTION_LEASE, DETECTION_LEASE_SECONDS) as acquired:
+            if not acquired:
+                detection_jobs_collection.update_one(
+                    {"_id": job_id, "status": "queued"},
+                    {"$set": {
+                        "status": "skipped",
+                        "failure": "Another discharge detection run is in progress",
+                        "finished_at": datetime.utcnow(),
+                        "updated_at": datetime.utcnow()
+                    }}
+                )
+                print(f"⏭️ Detection job {job_id} skipped: another run holds the lease")
+                return
+            return run_job(job_id, lease_held=True)
+    
+    from agents.discharge_agent import discharge_workflow
+    
+    job = detection_jobs_collection.find_one_and_update(
+        {"_id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.utcnow(), "updated_at": datetime.utcnow()}}
+    )
+    if not job:
+        return
+    
+    progress = JobProgress(job_id)
+    try:
+        result = discharge_workflow.invoke({
+            "input": "start_detection",
+            **job.get("params", {}),
+            "on_result": progress
+        })
+        progress.flush()
+        detection_jobs_collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": "done",
+                    "execution_mode": result.get("execution_mode"),
+                    "llm_calls": result.get("llm_calls", 0),
+                    "llm_calls_avoided": result.get("llm_calls_avoided", 0),
+                    "prescreen": result.get("prescreen_counts", {}),
+                    "skipped_unchanged": result.get("skipped_unchanged", 0),
+                    "write_errors": result.get("write_errors", []),
+                    "db_round_trips": result.get("db_round_trips", 0),
+                    "timing": result.get("timing", {}),
+                    "finished_at": datetime.utcnow(),
+                    "updated_at": datetime.utcnow()
+                },
+                "$push": {"errors": {"$each": [
+                    {"patient_id": e["patient_id"], "error": e["error"]} for e in result.get("write_errors", [])
+                ]}}
+            }
+        )
+        print(f"✅ Detection job {job_id} finished")
+    except Exception as e:
+        progress.flush()
+        detection_jobs_collection.update_one(
+            {"_id": job_id},
+            {"$set": {
+                "status": "failed",
+                "failure": str(e),
+                "finished_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }}
+        )
+        print(f"❌ Detection job {job_id} failed: {e}")
+
+def start_job(params):
+    """Queue a detection run and return its job id immediately"""
+    job_id = create_job(params)
+    _executor.submit(run_job, job_id)
+    return job_id
+
+def get_job(job_id, results_from=0, include_results=True):
+    projection = {"results": {"$slice": [results_from, 10000]}} if include_results else {"results": 0}
+    job = detection_jobs_collection.find_one({"_id": job_id}, projection)
+    if job:
+        job["job_id"] = job.pop("_id")
+    return job
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_job_events(job_id):
+    """
+    Server-Sent Events for a job: one `result` event per patient as results
+    land, `status` on status changes, and a final `done` event with the summary.
+    """
+    sent = 0
+    status = None
+    while True:
+        job = await asyncio.to_thread(get_job, job_id, sent)
+        if not job:
+            yield _sse("error", {"detail": "Job not found"})
+            return
+        
+        if job["status"] != status:
+            status = job["status"]
+            yield _sse("status", {"job_id": job_id, "status": status})
+        
+        for result in job.pop("results", []):
+            sent += 1
+            yield _sse("result", result)
+        
+        if status in FINISHED_STATUSES:
+            yield _sse("done", job)
+            return
+        
+        await asyncio.sleep(SSE_POLL_SECONDS)
@@ -0,0 +1,47 @@
+import re
+from functools import lru_cache
+
+GENERAL = "general"
+
+CATEGORY_KEYWORDS = {
+    "cardiac": ("heart", "myocardial", "cardiac"),
+    "stroke": ("stroke",),
+    "fracture": ("fracture",),
+    "surgical": ("surgery", "appendicitis"),
+    "respiratory": ("pneumonia", "copd", "asthma"),
+    "diabetes": ("diabetes",)
+}
+
+CATEGORIES = tuple(CATEGORY_KEYWORDS) + (GENERAL,)
+
+# A diagnosis mentioning several categories takes the first one listed. The
+# stored category (billing, analytics, pre-screen) follows the billing order,
+# so "stroke after surgery" is billed as stroke.
+CATEGORY_PRIORITY = ("cardiac", "stroke", "fracture", "surgical", "respiratory", "diabetes")
+# The nurse checklist and prescription fallbacks keep their own order, so the
+# same diagnosis gets the surgical care plan.
+CARE_PLAN_PRIORITY = ("cardiac", "surgical", "respiratory", "diabetes", "fracture", "stroke")
+
+_KEYWORD_CATEGORY = {
+    keyword: category
+    for category, keywords in CATEGORY_KEYWORDS.items()
+    for keyword in keywords
+}
+# Every keyword in one alternation, longest first so no keyword shadows a longer one
+_MATCHER = re.compile("|".join(
+    re.escape(keyword) for keyword in sorted(_KEYWORD_CATEGORY, key=len, reverse=True)
+))
+
+@lru_cache(maxsize=4096)
+def classify_diagnosis(diagnosis: str, priority=CATEGORY_PRIORITY) -> str:
+    """Category of a free-text diagnosis, memoized per distinct string"""
+    matches = {_KEYWORD_CATEGORY[m.group(0)] for m in _MATCHER.finditer((diagnosis or "").lower())}
+    return next((category for category in priority if category in matches), GENERAL)
+
+def diagnosis_category(patient) -> str:
+    """Stored category if the patient has one, otherwise classify the diagnosis"""
+    return patient.get("diagnosis_category") or classify_diagnosis(patient.get("diagnosis"))
+
+def care_plan_category(patient) -> str:
+    """Category for the nurse checklist and prescription fallbacks (CARE_PLAN_PRIORITY)"""
+    return classify_diagnosis(patient.get("diagnosis"), CARE_PLAN_PRIORITY)
@@ -0,0 +1,336 @@
+import os
+import random
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from analytics import update_patient_stage
+from database import email_outbox_collection, discharge_logs_collection
+from fingerprints import compute_fingerprint
+from email_service import build_message, nurse_notification_email, guardian_packet_email, guardian_packet_filename, smtp_pool
+from pdf_cache import document_key, get_or_render, submit_cached
+from pdf_service import DOCUMENT_PATIENT_FIELDS, document_patient
+
+# Delivery threads per process; 0 leaves the queue to workers elsewhere
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "2"))
+# Idle workers re-check for due retries and other processes' messages this often
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+# Retries back off exponentially from the base delay up to the cap; a message
+# still failing after EMAIL_MAX_ATTEMPTS is dead-lettered
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "3600"))
+# A claimed message whose worker died becomes claimable again after this
+EMAIL_CLAIM_SECONDS = int(os.getenv("EMAIL_CLAIM_SECONDS", "300"))
+
+# pending -> sending -> sent, or back to pending to retry, or dead. A failed
+# message is superseded instead of retried when newer content for the same
+# recipient was queued while it was being sent.
+OUTBOX_STATUSES = ("pending", "sending", "sent", "dead", "superseded")
+
+# Patient fields the nurse notification template reads
+NURSE_PATIENT_FIELDS = DOCUMENT_PATIENT_FIELDS + ("treatment_status", "vital_signs")
+
+# ==================== TEMPLATES ====================
+
+def _nurse_notification(message):
+    subject, html_body = nurse_notification_email(message["context"]["patient"])
+    return build_message(message["to"], subject, html_body)
+
+def _nurse_notified(message):
+    discharge_logs_collection.insert_one({
+        "patient_id": message["patient_id"],
+        "action": "nurse_notified",
+        "details": f"Discharge approval sent to nurse at {message['to']}",
+        "agent": "System",
+        "timestamp": datetime.utcnow()
+    })
+
+def _guardian_packet(message):
+    context, attachment = message["context"], message["attachment"]
+    subject, html_body = guardian_packet_email(context["patient"], context["bill"])
+    # Normally a cache hit: the render was queued when the message was
+    _, pdf = get_or_render(attachment["kind"], *attachment["args"])
+    return build_message(message["to"], subject, html_body, BytesIO(pdf), attachment["filename"])
+
+def _guardian_notified(message):
+    update_patient_stage(message["patient_id"], "discharge_complete", {
+        "guardian_notified_at": datetime.utcnow()
+    })
+    discharge_logs_collection.insert_one({
+        "patient_id": message["patient_id"],
+        "action": "guardian_notified",
+        "details": f"Discharge documents sent to {message['to']}",
+        "agent": "System",
+        "timestamp": datetime.utcnow()
+    })
+
+# template -> (build the MIME message, apply its effects once delivered)
+TEMPLATES = {
+    "nurse_notification": (_nurse_notification, _nurse_notified),
+    "guardian_packet": (_guardian_packet, _guardian_notified)
+}
+
+# ==================== QUEUE ====================
+
+def enqueue_email(template, to, patient_id, context, attachment=None):
+    """
+    Store a message for background delivery and return its id. Asking again
+    for the same content while it is still queued returns the queued message.
+    New content (a regenerated summary, prescription or bill) replaces that
+    of a message still pending, so the recipient never gets a stale version.
+    """
+    if template not in TEMPLATES:
+        raise ValueError(f"unknown email template '{template}'")
+
+    content_key = compute_fingerprint(template, to, patient_id, context, (attachment or {}).get("key"))
+    unsent = {"template": template, "to": to, "patient_id": patient_id}
+    existing = email_outbox_collection.find_one(
+        {**unsent, "content_key": content_key, "status": {"$in": ["pending", "sending"]}},
+        {"_id": 1}
+    )
+    if existing:
+        return existing["_id"]
+
+    # At most one message per recipient and template is pending (a unique
+    # partial index), so one upsert either replaces its content or inserts it.
+    # A message already being sent keeps its content; the new one is queued after it.
+    now = datetime.utcnow()
+    update = {
+        "$set": {"context": context, "attachment": attachment, "content_key": content_key, "updated_at": now},
+        "$setOnInsert": {"_id": uuid.uuid4().hex, "attempts": 0, "next_attempt_at": now, "created_at": now}
+    }
+    try:
+        message = _upsert_pending(unsent, update)
+    except DuplicateKeyError:
+        # A concurrent enqueue inserted first; the retry updates its message
+        message = _upsert_pending(unsent, update)
+    email_outbox.notify()
+    return message["_id"]
+
+def _upsert_pending(unsent, update):
+    return email_outbox_collection.find_one_and_update(
+        {**unsent, "status": "pending"},
+        update,
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+
+def enqueue_nurse_notification(nurse_email, patient):
+    context = {"patient": {field: patient.get(field) for field in NURSE_PATIENT_FIELDS}}
+    return enqueue_email("nurse_notification", nurse_email, patient["patient_id"], context)
+
+def enqueue_guardian_packet(guardian_email, patient, summary, prescription, bill):
+    """Queue the discharge package; the PDF starts rendering now so delivery finds it cached"""
+    details = document_patient(patient)
+    args = [details, summary, prescription, bill]
+    try:
+        submit_cached("discharge", *args)
+    except Exception as e:
+        # The worker renders it instead
+        print(f"⚠️ Could not pre-render discharge PDF for {patient['patient_id']}: {e}")
+
+    attachment = {
+        "kind": "discharge",
+        "key": document_key("discharge", *args),
+        "filename": guardian_packet_filename(patient),
+        "args": args
+    }
+    return enqueue_email("guardian_packet", guardian_email, patient["patient_id"],
+                         {"patient": details, "bill": bill}, attachment)
+
+def retry_delay(attempts):
+    """Seconds before retry number `attempts`: exponential, capped, with jitter so retries spread out"""
+    delay = min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def _is_permanent(e):
+    # Rejected recipients and other 5xx replies will not succeed on a retry
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 500 <= e.smtp_code < 600
+    return False
+
+def claim_next():
+    """Atomically take the next due message (or one whose worker's claim expired)"""
+    now = datetime.utcnow()
+    return email_outbox_collection.find_one_and_update(
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claim_expires_at": {"$lte": now}}
+        ]},
+        {
+            "$set": {
+                "status": "sending",
+                "claim": uuid.uuid4().hex,
+                "claim_expires_at": now + timedelta(seconds=EMAIL_CLAIM_SECONDS),
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def deliver(message):
+    """Send one claimed message and record the outcome"""
+    claimed = {"_id": message["_id"], "claim": message["claim"]}
+    build, on_delivered = TEMPLATES.get(message["template"], (None, None))
+    try:
+        if build is None:
+            raise ValueError(f"unknown email template '{message['template']}'")
+        smtp_pool.send(build(message))
+    except Exception as e:
+        now = datetime.utcnow()
+        attempts = message["attempts"]
+        if isinstance(e, ValueError) or _is_permanent(e) or attempts >= EMAIL_MAX_ATTEMPTS:
+            email_outbox_collection.update_one(claimed, {"$set": {
+                "status": "dead",
+                "last_error": str(e),
+                "dead_at": now,
+                "updated_at": now
+            }})
+            discharge_logs_collection.insert_one({
+                "patient_id": message["patient_id"],
+                "action": "email_failed",
+                "details": f"Could not deliver {message['template']} to {message['to']} after {attempts} attempt(s): {e}",
+                "agent": "System",
+                "timestamp": now
+            })
+            print(f"❌ Email {message['_id']} ({message['template']}) dead-lettered: {e}")
+        else:
+            delay = retry_delay(attempts)
+            try:
+                email_outbox_collection.update_one(claimed, {"$set": {
+                    "status": "pending",
+                    "last_error": str(e),
+                    "next_attempt_at": now + timedelta(seconds=delay),
+                    "updated_at": now
+                }})
+                print(f"⚠️ Email {message['_id']} ({message['template']}) failed, retrying in {delay:.0f}s: {e}")
+            except DuplicateKeyError:
+                # Newer content was queued meanwhile; that message is sent instead
+                email_outbox_collection.update_one(claimed, {"$set": {
+                    "status": "superseded",
+                    "last_error": str(e),
+                    "updated_at": now
+                }})
+                print(f"⚠️ Email {message['_id']} ({message['template']}) failed and was superseded: {e}")
+        return False
+
+    # Mark it sent before applying effects, so a crash here never re-sends the email
+    now = datetime.utcnow()
+    email_outbox_collection.update_one(claimed, {"$set": {"status": "sent", "sent_at": now, "updated_at": now}})
+    try:
+        on_delivered(message)
+    except Exception as e:
+        email_outbox_collection.update_one({"_id": message["_id"]}, {"$set": {"delivery_hook_error": str(e)}})
+        print(f"⚠️ Email {message['_id']} sent but its status update failed: {e}")
+    print(f"📧 {message['template']} delivered to {message['to']}")
+    return True
+
+def requeue(message_id):
+    """
+    Put a dead-lettered message back in the queue with a fresh attempt budget.
+    If newer content for the same recipient is already pending, that message
+    is returned instead.
+    """
+    now = datetime.utcnow()
+    try:
+        return email_outbox_collection.find_one_and_update(
+            {"_id": message_id, "status": "dead"},
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": now, "updated_at": now}},
+            projection={"attachment.args": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        dead = email_outbox_collection.find_one({"_id": message_id}, {"template": 1, "to": 1, "patient_id": 1})
+        return email_outbox_collection.find_one(
+            {"template": dead["template"], "to": dead["to"], "patient_id": dead["patient_id"], "status": "pending"},
+            {"attachment.args": 0}
+        )
+
+def outbox_counts():
+    counts = {status: 0 for status in OUTBOX_STATUSES}
+    for row in email_outbox_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+# ==================== WORKERS ====================
+
+class EmailOutbox:
+    """
+    Background threads that drain the outbox. New messages wake them at once;
+    otherwise they poll, which also picks up due retries and expired claims.
+    Claims are atomic, so any number of processes can run workers.
+    """
+
+    def __init__(self, workers=EMAIL_OUTBOX_WORKERS, poll_seconds=EMAIL_OUTBOX_POLL_SECONDS):
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.delivered = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self.workers <= 0 or self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"email-outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"📬 Email outbox started ({self.workers} workers)")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def notify(self):
+        self._wake.set()
+
+    def status(self):
+        return {
+            "workers": self.workers,
+            "running": sum(thread.is_alive() for thread in self._threads),
+            "delivered": self.delivered,
+            "failed": self.failed
+        }
+
+    def run_once(self):
+        """Deliver one due message; False when there was none"""
+        message = claim_next()
+        if message is None:
+            return False
+        ok = deliver(message)
+        with self._lock:
+            if ok:
+                self.delivered += 1
+            else:
+                self.failed += 1
+        return True
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"❌ Email outbox worker error: {e}")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+email_outbox = EmailOutbox()
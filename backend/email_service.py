@@ -1,4 +1,4 @@
-import smtplib
+import asyncio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -6,207 +6,63 @@ from email import encoders
 import os
 from dotenv import load_dotenv
 from io import BytesIO
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
+from pdf_cache import get_or_render, submit_cached
+from pdf_service import document_patient
+from smtp_pool import SMTPPool
 
 load_dotenv()
 
 # Email configuration
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 SENDER_PASSWORD = os.getenv("SENDER_APP_PASSWORD")
 
+# Authenticated connections kept open between sends; nothing connects until the first email
+smtp_pool = SMTPPool(SMTP_SERVER, SMTP_PORT, SENDER_EMAIL, SENDER_PASSWORD, starttls=SMTP_STARTTLS)
+
 def create_discharge_pdf(patient, summary, prescription, bill):
-    """Create a professional hospital discharge PDF"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=40, bottomMargin=40)
-    
-    styles = getSampleStyleSheet()
-    
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=5,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'Subtitle',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#666666'),
-        spaceAfter=20,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=13,
-        textColor=colors.HexColor('#1a1a1a'),
-        spaceAfter=10,
-        spaceBefore=15,
-        fontName='Helvetica-Bold'
-    )
-    
-    body_style = ParagraphStyle(
-        'BodyText',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.HexColor('#333333'),
-        leading=14,
-        alignment=TA_JUSTIFY
-    )
-    
-    story = []
-    
-    # Hospital Header
-    story.append(Paragraph("ST. JUDE'S MEDICAL CENTER", title_style))
-    story.append(Paragraph("123 Medical Plaza, Healthcare District, Mumbai - 400001", subtitle_style))
-    story.append(Paragraph("Phone: +91-22-2345-6789 | Email: info@stjudes.com | www.stjudes.com", subtitle_style))
-    
-    # Horizontal line
-    story.append(Spacer(1, 0.1*inch))
-    line_table = Table([['']], colWidths=[7*inch])
-    line_table.setStyle(TableStyle([('LINEABOVE', (0,0), (-1,0), 1, colors.HexColor('#cccccc'))]))
-    story.append(line_table)
-    story.append(Spacer(1, 0.2*inch))
-    
-    # Document title
-    story.append(Paragraph("DISCHARGE SUMMARY", heading_style))
-    story.append(Spacer(1, 0.1*inch))
-    
-    # Patient Information Table
-    patient_data = [
-        ['Patient Name:', patient['name'], 'Patient ID:', patient['patient_id']],
-        ['Age:', f"{patient['age']} years", 'Gender:', 'Male'],
-        ['Diagnosis:', patient['diagnosis'], '', ''],
-        ['Admission Date:', patient['admission_date'], 'Discharge Date:', bill['discharge_date']],
-    ]
-    
-    patient_table = Table(patient_data, colWidths=[1.3*inch, 2*inch, 1.3*inch, 2*inch])
-    patient_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(patient_table)
-    story.append(Spacer(1, 0.2*inch))
-    
-    # Medical Summary
-    story.append(Paragraph("CLINICAL SUMMARY", heading_style))
-    summary_lines = summary.split('\n')
-    for line in summary_lines:
-        if line.strip():
-            story.append(Paragraph(line.strip(), body_style))
-            story.append(Spacer(1, 0.05*inch))
-    story.append(Spacer(1, 0.1*inch))
-    
-    # Prescription
-    story.append(Paragraph("PRESCRIPTION", heading_style))
-    prescription_lines = prescription.split('\n')
-    for line in prescription_lines:
-        if line.strip():
-            story.append(Paragraph(line.strip(), body_style))
-            story.append(Spacer(1, 0.05*inch))
-    story.append(Spacer(1, 0.2*inch))
-    
-    # Billing Information
-    story.append(Paragraph("FINANCIAL SUMMARY", heading_style))
-    
-    bill_data = [
-        ['DESCRIPTION', 'AMOUNT (₹)'],
-        ['Room Charges', f"{bill['breakdown']['room_charges']:,.2f}"],
-        ['Doctor Consultation', f"{bill['breakdown']['doctor_charges']:,.2f}"],
-        ['Nursing Care', f"{bill['breakdown'].get('nursing_charges', 0):,.2f}"],
-        ['Pharmacy & Medications', f"{bill['breakdown']['prescription_cost']:,.2f}"],
-    ]
-    
-    if bill['breakdown'].get('additional_charges', 0) > 0:
-        bill_data.append(['Medical Procedures & Diagnostics', f"{bill['breakdown']['additional_charges']:,.2f}"])
-    
-    bill_data.extend([
-        ['Subtotal', f"{bill['breakdown'].get('subtotal', 0):,.2f}"],
-        ['GST (18%)', f"{bill['breakdown'].get('gst_18_percent', 0):,.2f}"],
-        ['TOTAL PAYABLE', f"{bill['total_amount']:,.2f}"],
-    ])
-    
-    bill_table = Table(bill_data, colWidths=[5*inch, 2*inch])
-    bill_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTSIZE', (0, 1), (-1, -2), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('LINEBELOW', (0, -3), (-1, -3), 1, colors.HexColor('#cccccc')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 11),
-        ('LINEABOVE', (0, -1), (-1, -1), 1.5, colors.HexColor('#333333')),
-    ]))
-    story.append(bill_table)
-    story.append(Spacer(1, 0.3*inch))
+    """Create a professional hospital discharge PDF (cached, rendered on the PDF process pool)"""
+    _, pdf = get_or_render("discharge", document_patient(patient), summary, prescription, bill)
+    return BytesIO(pdf)
+
+def build_message(to_email, subject, html_body, pdf_buffer=None, pdf_filename="document.pdf"):
+    """MIME message with an HTML body and an optional PDF attachment"""
+    msg = MIMEMultipart('mixed')
+    msg['From'] = f"St. Jude's Medical Center <{SENDER_EMAIL}>"
+    msg['To'] = to_email
+    msg['Subject'] = subject
     
-    # Footer
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=8,
-        textColor=colors.HexColor('#666666'),
-        alignment=TA_CENTER
-    )
+    # Attach HTML body
+    html_part = MIMEText(html_body, 'html')
+    msg.attach(html_part)
     
-    story.append(Spacer(1, 0.2*inch))
-    story.append(Paragraph("This is a computer-generated document. For any queries, please contact our billing department.", footer_style))
-    story.append(Paragraph("Payment is due within 7 days. We accept cash, card, and online transfers.", footer_style))
-    story.append(Spacer(1, 0.1*inch))
-    story.append(Paragraph("Thank you for choosing St. Jude's Medical Center for your healthcare needs.", footer_style))
+    # Attach PDF if provided
+    if pdf_buffer:
+        pdf_attachment = MIMEBase('application', 'pdf')
+        pdf_attachment.set_payload(pdf_buffer.read())
+        encoders.encode_base64(pdf_attachment)
+        pdf_attachment.add_header('Content-Disposition', f'attachment; filename={pdf_filename}')
+        msg.attach(pdf_attachment)
     
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    return msg
 
 def send_email_with_attachment(to_email, subject, html_body, pdf_buffer=None, pdf_filename="document.pdf"):
     """Send email with PDF attachment"""
     try:
-        msg = MIMEMultipart('mixed')
-        msg['From'] = f"St. Jude's Medical Center <{SENDER_EMAIL}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Attach HTML body
-        html_part = MIMEText(html_body, 'html')
-        msg.attach(html_part)
-        
-        # Attach PDF if provided
-        if pdf_buffer:
-            pdf_attachment = MIMEBase('application', 'pdf')
-            pdf_attachment.set_payload(pdf_buffer.read())
-            encoders.encode_base64(pdf_attachment)
-            pdf_attachment.add_header('Content-Disposition', f'attachment; filename={pdf_filename}')
-            msg.attach(pdf_attachment)
-        
-        # Send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        smtp_pool.send(build_message(to_email, subject, html_body, pdf_buffer, pdf_filename))
+        print(f"Email sent successfully to {to_email}")
+        return True
         
+    except Exception as e:
+        print(f"Failed to send email to {to_email}: {str(e)}")
+        return False
+
+async def send_email_with_attachment_async(to_email, subject, html_body, pdf_buffer=None, pdf_filename="document.pdf"):
+    """send_email_with_attachment for asyncio callers; the SMTP exchange runs on the pool's threads"""
+    try:
+        await smtp_pool.send_async(build_message(to_email, subject, html_body, pdf_buffer, pdf_filename))
         print(f"Email sent successfully to {to_email}")
         return True
         
@@ -218,8 +74,11 @@ def send_email(to_email, subject, html_body):
     """Send simple email without attachment"""
     return send_email_with_attachment(to_email, subject, html_body, None)
 
-def send_nurse_notification(nurse_email, patient):
-    """Send notification to nurse when doctor approves patient for discharge"""
+async def send_email_async(to_email, subject, html_body):
+    return await send_email_with_attachment_async(to_email, subject, html_body, None)
+
+def nurse_notification_email(patient):
+    """Subject and HTML body of the nurse's discharge-approval notification"""
     subject = f"Patient Discharge Approval - {patient['name']} (ID: {patient['patient_id']})"
     
     html_body = f"""
@@ -435,16 +294,12 @@ def send_nurse_notification(nurse_email, patient):
     </html>
     """
     
-    return send_email(nurse_email, subject, html_body)
+    return subject, html_body
 
-def send_discharge_summary_to_guardian(guardian_email, patient, summary, prescription, bill):
-    """Send complete discharge package to patient's guardian"""
+def guardian_packet_email(patient, bill):
+    """Subject and HTML body of the discharge package sent to the guardian"""
     subject = f"Discharge Summary and Documentation - {patient['name']} (ID: {patient['patient_id']})"
     
-    # Create PDF
-    pdf_buffer = create_discharge_pdf(patient, summary, prescription, bill)
-    pdf_filename = f"Discharge_Summary_{patient['patient_id']}.pdf"
-    
     html_body = f"""
     <!DOCTYPE html>
     <html>
@@ -619,7 +474,7 @@ def send_discharge_summary_to_guardian(guardian_email, patient, summary, prescri
                 
                 <div class="payment-notice">
                     <p style="margin: 0 0 8px 0; font-weight: 600;">Payment Information:</p>
-                    <p style="margin: 0;">Total Amount Due: <span class="amount">₹{bill['total_amount']:,.2f}</span></p>
+                    <p style="margin: 0;">Total Amount Due: <span class="amount">{bill.get('currency_symbol', '₹')}{bill['total_amount']:,.2f}</span></p>
                     <p style="margin: 8px 0 0 0; font-size: 12px; color: #666;">Payment is requested within 7 days. Please retain this document for your records.</p>
                 </div>
                 
@@ -664,7 +519,33 @@ def send_discharge_summary_to_guardian(guardian_email, patient, summary, prescri
     </html>
     """
     
-    return send_email_with_attachment(guardian_email, subject, html_body, pdf_buffer, pdf_filename)
+    return subject, html_body
+
+def send_nurse_notification(nurse_email, patient):
+    """Send notification to nurse when doctor approves patient for discharge"""
+    subject, html_body = nurse_notification_email(patient)
+    return send_email(nurse_email, subject, html_body)
+
+async def send_nurse_notification_async(nurse_email, patient):
+    subject, html_body = nurse_notification_email(patient)
+    return await send_email_async(nurse_email, subject, html_body)
+
+def guardian_packet_filename(patient):
+    return f"Discharge_Summary_{patient['patient_id']}.pdf"
+
+def send_discharge_summary_to_guardian(guardian_email, patient, summary, prescription, bill):
+    """Send complete discharge package to patient's guardian"""
+    subject, html_body = guardian_packet_email(patient, bill)
+    pdf_buffer = create_discharge_pdf(patient, summary, prescription, bill)
+    return send_email_with_attachment(guardian_email, subject, html_body, pdf_buffer, guardian_packet_filename(patient))
+
+async def send_discharge_summary_to_guardian_async(guardian_email, patient, summary, prescription, bill):
+    subject, html_body = guardian_packet_email(patient, bill)
+    # Render on the PDF pool without holding up the event loop
+    pdf = await asyncio.wrap_future(submit_cached("discharge", document_patient(patient), summary, prescription, bill))
+    return await send_email_with_attachment_async(
+        guardian_email, subject, html_body, BytesIO(pdf), guardian_packet_filename(patient)
+    )
 
 def send_test_email(to_email):
     """Send a test email"""
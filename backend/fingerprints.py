@@ -0,0 +1,22 @@
+import hashlib
+import json
+
+def compute_fingerprint(*parts) -> str:
+    """Stable SHA-256 over JSON-serialisable parts (datetimes and ObjectIds via str)"""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Patient fields that feed the clinical documents (summary, prescription)
+CLINICAL_FIELDS = (
+    "name",
+    "age",
+    "diagnosis",
+    "admission_date",
+    "treatment_status",
+    "ready_for_discharge",
+    "vital_signs"
+)
+
+def clinical_fingerprint(patient, handover_note=""):
+    """Fingerprint of the patient's clinical fields plus the nurse handover note"""
+    return compute_fingerprint({field: patient.get(field) for field in CLINICAL_FIELDS}, handover_note or "")
@@ -0,0 +1,76 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import leases_collection
+
+def acquire_lease(name, ttl_seconds):
+    """
+    Try to take the named lease. Returns an owner token on success, None if
+    another holder's lease has not expired yet. Safe across processes and hosts.
+    """
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    try:
+        doc = leases_collection.find_one_and_update(
+            {"_id": name, "expires_at": {"$lte": now}},
+            {"$set": {"owner": token, "acquired_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The lease document exists and is still held by someone else
+        return None
+    return token if doc and doc.get("owner") == token else None
+
+def renew_lease(name, token, ttl_seconds):
+    result = leases_collection.update_one(
+        {"_id": name, "owner": token},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds)}}
+    )
+    return result.matched_count == 1
+
+def release_lease(name, token):
+    # Expire rather than delete so the next acquirer goes through the same upsert path
+    leases_collection.update_one(
+        {"_id": name, "owner": token},
+        {"$set": {"expires_at": datetime.utcnow(), "owner": None}}
+    )
+
+def get_lease(name):
+    doc = leases_collection.find_one({"_id": name})
+    if not doc or not doc.get("owner") or doc["expires_at"] <= datetime.utcnow():
+        return None
+    return doc
+
+@contextmanager
+def held_lease(name, ttl_seconds):
+    """
+    Context manager yielding True while the lease is held (renewed in the
+    background every ttl/3), or False if someone else holds it.
+    """
+    token = acquire_lease(name, ttl_seconds)
+    if not token:
+        yield False
+        return
+    
+    stop = threading.Event()
+    
+    def heartbeat():
+        while not stop.wait(ttl_seconds / 3):
+            if not renew_lease(name, token, ttl_seconds):
+                print(f"⚠️ Lost lease {name}")
+                return
+    
+    thread = threading.Thread(target=heartbeat, name=f"lease-{name}", daemon=True)
+    thread.start()
+    try:
+        yield True
+    finally:
+        stop.set()
+        thread.join()
+        release_lease(name, token)
@@ -0,0 +1,191 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from database import llm_cache_collection
+from fingerprints import compute_fingerprint
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))        # in-process LRU tier
+LLM_CACHE_MAX_DOCUMENTS = int(os.getenv("LLM_CACHE_MAX_DOCUMENTS", "50000"))   # MongoDB tier
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Trim the MongoDB tier back to LLM_CACHE_MAX_DOCUMENTS every this many stores
+_TRIM_EVERY = 100
+
+class LLMResponseCache:
+    """
+    Two-tier cache of LLM completions keyed by hash(model, temperature, prompt):
+    an in-process LRU in front of a persistent MongoDB collection.
+    """
+    
+    def __init__(self, collection, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 max_documents=LLM_CACHE_MAX_DOCUMENTS, ttl_seconds=LLM_CACHE_TTL_SECONDS):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.max_documents = max_documents
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stores = 0
+        self.counters = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+    
+    @staticmethod
+    def make_key(model, temperature, prompt) -> str:
+        return compute_fingerprint(model, temperature, prompt)
+    
+    def get(self, key) -> Optional[str]:
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                content, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return content
+                del self._entries[key]
+        
+        try:
+            doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}})
+        except Exception as e:
+            print(f"⚠️ LLM cache lookup failed: {e}")
+            doc = None
+            self._count("errors")
+        
+        if doc is None:
+            self._count("misses")
+            return None
+        
+        self._remember(key, doc["content"], doc["expires_at"])
+        self._count("mongo_hits")
+        return doc["content"]
+    
+    def set(self, key, content, model=None):
+        now = datetime.utcnow()
+        expires_at = now + self.ttl
+        self._remember(key, content, expires_at)
+        self._count("stores")
+        
+        try:
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {"content": content, "model": model, "created_at": now, "expires_at": expires_at}},
+                upsert=True
+            )
+            with self._lock:
+                self._stores += 1
+                trim = self._stores % _TRIM_EVERY == 0
+            if trim:
+                self._trim_collection()
+        except Exception as e:
+            print(f"⚠️ LLM cache store failed: {e}")
+            self._count("errors")
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.collection.delete_many({})
+    
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            counters["memory_entries"] = len(self._entries)
+        hits = counters["memory_hits"] + counters["mongo_hits"]
+        lookups = hits + counters["misses"]
+        counters["hit_rate"] = round(hits / lookups, 3) if lookups else None
+        return counters
+    
+    def _remember(self, key, content, expires_at):
+        with self._lock:
+            self._entries[key] = (content, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+    
+    def _trim_collection(self):
+        """Size-based eviction of the oldest documents beyond max_documents"""
+        excess = self.collection.count_documents({}) - self.max_documents
+        if excess <= 0:
+            return
+        oldest = [doc["_id"] for doc in self.collection.find({}, {"_id": 1}).sort("created_at", 1).limit(excess)]
+        self.collection.delete_many({"_id": {"$in": oldest}})
+        self._count("evictions", len(oldest))
+    
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+llm_cache = LLMResponseCache(llm_cache_collection)
+
+class CachedChatModel:
+    """
+    Wraps a chat model so invoke/ainvoke on a plain-string prompt are served
+    from llm_cache when the same (model, temperature, prompt) was seen before.
+    Everything else is delegated to the wrapped model.
+    """
+    
+    def __init__(self, llm, cache=None):
+        self.llm = llm
+        self.cache = cache or llm_cache
+    
+    @property
+    def model_name(self):
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+    
+    def cache_key(self, prompt):
+        return self.cache.make_key(self.model_name, getattr(self.llm, "temperature", None), prompt)
+    
+    def invoke(self, prompt, *args, **kwargs):
+        if not LLM_CACHE_ENABLED or not isinstance(prompt, str):
+            return self.llm.invoke(prompt, *args, **kwargs)
+        
+        key = self.cache_key(prompt)
+        content = self.cache.get(key)
+        if content is not None:
+            return AIMessage(content=content)
+        
+        response = self.llm.invoke(prompt, *args, **kwargs)
+        self.cache.set(key, response.content, self.model_name)
+        return response
+    
+    async def ainvoke(self, prompt, *args, **kwargs):
+        if not LLM_CACHE_ENABLED or not isinstance(prompt, str):
+            return await self.llm.ainvoke(prompt, *args, **kwargs)
+        
+        key = self.cache_key(prompt)
+        content = await asyncio.to_thread(self.cache.get, key)
+        if content is not None:
+            return AIMessage(content=content)
+        
+        response = await self.llm.ainvoke(prompt, *args, **kwargs)
+        await asyncio.to_thread(self.cache.set, key, response.content, self.model_name)
+        return response
+    
+    def stream(self, prompt, *args, **kwargs):
+        """Yield chunks from the model, or the whole cached completion as a single chunk"""
+        if not LLM_CACHE_ENABLED or not isinstance(prompt, str):
+            yield from self.llm.stream(prompt, *args, **kwargs)
+            return
+        
+        key = self.cache_key(prompt)
+        content = self.cache.get(key)
+        if content is not None:
+            yield AIMessageChunk(content=content)
+            return
+        
+        parts = []
+        for chunk in self.llm.stream(prompt, *args, **kwargs):
+            parts.append(chunk.content)
+            yield chunk
+        # Only completed streams are cached
+        self.cache.set(key, "".join(parts), self.model_name)
+    
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
@@ -0,0 +1,110 @@
+import asyncio
+import os
+import threading
+
+import groq
+import httpx
+from langchain_groq import ChatGroq
+
+from llm_cache import CachedChatModel
+
+GROQ_API_BASE = os.getenv("GROQ_API_BASE") or "https://api.groq.com"
+
+# Open connections to Groq in the background at startup
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() != "false"
+
+# Connection pool shared by every agent's client
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "16"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+_lock = threading.Lock()
+_llms = {}
+_registered = set()
+_sync_client = None
+_async_client = None
+_loop = None
+
+def _limits():
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS
+    )
+
+def _api_key():
+    return os.getenv("GROQ_API_KEY")
+
+def _groq_clients():
+    """One Groq / AsyncGroq pair (and HTTP connection pool) for the whole process"""
+    global _sync_client, _async_client
+    if _sync_client is None:
+        _sync_client = groq.Groq(
+            api_key=_api_key(),
+            base_url=GROQ_API_BASE,
+            http_client=httpx.Client(limits=_limits(), timeout=LLM_TIMEOUT_SECONDS)
+        )
+        _async_client = groq.AsyncGroq(
+            api_key=_api_key(),
+            base_url=GROQ_API_BASE,
+            http_client=httpx.AsyncClient(limits=_limits(), timeout=LLM_TIMEOUT_SECONDS)
+        )
+    return _sync_client, _async_client
+
+def register_llm(model, temperature):
+    """Declare a (model, temperature) an agent uses so warm_up() can prepare it; creates nothing"""
+    with _lock:
+        _registered.add((model, temperature))
+
+def get_llm(model, temperature):
+    """Shared, cache-wrapped chat model for (model, temperature), created on first use"""
+    key = (model, temperature)
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+    
+    with _lock:
+        if key not in _llms:
+            sync_client, async_client = _groq_clients()
+            _llms[key] = CachedChatModel(ChatGroq(
+                api_key=_api_key(),
+                model=model,
+                temperature=temperature,
+                client=sync_client.chat.completions,
+                async_client=async_client.chat.completions
+            ))
+            _registered.add(key)
+        return _llms[key]
+
+def _event_loop():
+    """
+    Long-lived event loop for async LLM calls. Pooled AsyncClient connections
+    are bound to the loop that opened them, so every async call goes through
+    this one loop instead of a fresh asyncio.run() per detection run.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-event-loop", daemon=True).start()
+    return _loop
+
+def run_async(coro):
+    """Run a coroutine on the shared LLM event loop and wait for its result"""
+    return asyncio.run_coroutine_threadsafe(coro, _event_loop()).result()
+
+def warm_up():
+    """Create every registered client and open keep-alive connections to Groq ahead of the first request"""
+    with _lock:
+        specs = sorted(_registered)
+    for model, temperature in specs:
+        get_llm(model, temperature)
+    
+    sync_client, async_client = _groq_clients()
+    try:
+        sync_client.models.list()
+        run_async(async_client.models.list())
+        print(f"🔥 LLM clients warmed up: {', '.join(model for model, _ in specs)}")
+    except Exception as e:
+        print(f"⚠️ LLM warm-up request failed: {e}")
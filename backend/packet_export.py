@@ -0,0 +1,139 @@
+import csv
+import io
+import os
+import zipfile
+from collections import deque
+from datetime import datetime
+
+from database import patients_collection
+from pdf_cache import submit_cached
+from pdf_service import PDF_QUEUE_SIZE, PDF_RENDER_TIMEOUT, document_patient
+
+# Patients rendered ahead of the one being written to the archive. Three
+# documents each; the default keeps an export to half the render queue so
+# interactive downloads still get slots.
+EXPORT_WINDOW = int(os.getenv("EXPORT_WINDOW", str(max(PDF_QUEUE_SIZE // 6, 1))))
+
+# Statuses whose packet is complete enough to export
+EXPORT_STATUSES = ("billing_completed", "discharge_complete")
+
+_EXPORT_PROJECTION = {
+    "_id": 0, "patient_id": 1, "name": 1, "age": 1, "diagnosis": 1, "admission_date": 1,
+    "status": 1, "summary": 1, "prescription": 1, "bill": 1
+}
+
+def patient_documents(patient, issued_on=None):
+    """
+    (filename, kind, args) for each document in the patient's discharge packet,
+    with the same defaults the single-document downloads use.
+    """
+    patient_id = patient["patient_id"]
+    details = document_patient(patient)
+
+    summary = patient.get("summary", "Summary not available")
+
+    prescription = patient.get("prescription", "Prescription not available")
+    if isinstance(prescription, dict):
+        prescription = str(prescription)
+
+    bill = patient.get("bill")
+    if not bill:
+        from agents.billing_agent import calculate_bill
+        bill = calculate_bill(patient)
+
+    return [
+        (f"Discharge_Summary_{patient_id}.pdf", "summary", (details, summary)),
+        (f"Prescription_{patient_id}.pdf", "prescription",
+         (details, prescription, issued_on or datetime.utcnow().strftime('%Y-%m-%d'))),
+        (f"Bill_{patient_id}.pdf", "bill", (details, bill)),
+    ]
+
+def export_query(start=None, end=None, statuses=None):
+    """Patients discharged (billed) between start and end, inclusive, in the given statuses"""
+    query = {"status": {"$in": list(statuses or EXPORT_STATUSES)}}
+    if start or end:
+        query["bill.discharge_date"] = {**({"$gte": start} if start else {}), **({"$lte": end} if end else {})}
+    return query
+
+class _ZipSink:
+    """Write-only file object for ZipFile; the bytes are drained after each entry"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_discharge_packets(query):
+    """
+    Yield a ZIP archive with one folder of PDFs per matching patient plus a
+    manifest.csv. ZipFile writes to a non-seekable sink, so memory holds only
+    the patients inside the render window, never the archive. A patient whose
+    documents cannot be built or rendered is listed in the manifest with the
+    error instead of ending the export.
+    """
+    sink = _ZipSink()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["patient_id", "name", "status", "admission_date", "discharge_date", "files", "error"])
+
+    issued_on = datetime.utcnow().strftime('%Y-%m-%d')
+    cursor = patients_collection.find(query, _EXPORT_PROJECTION).sort([("bill.discharge_date", 1), ("patient_id", 1)])
+    in_flight = deque()
+
+    def submit(patient):
+        futures = []
+        try:
+            for filename, kind, args in patient_documents(patient, issued_on):
+                futures.append((filename, submit_cached(kind, *args)))
+        except Exception as e:
+            # Includes PdfQueueFull; the patient's other renders are not needed
+            for _, future in futures:
+                future.cancel()
+            in_flight.append((patient, [], str(e)))
+            return
+        in_flight.append((patient, futures, None))
+
+    # PDFs are already compressed, so entries are stored rather than deflated
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        try:
+            for patient in cursor:
+                submit(patient)
+                if len(in_flight) < EXPORT_WINDOW:
+                    continue
+                yield from _write_patient(archive, sink, writer, *in_flight.popleft())
+            while in_flight:
+                yield from _write_patient(archive, sink, writer, *in_flight.popleft())
+        finally:
+            for _, futures, _ in in_flight:
+                for _, future in futures:
+                    future.cancel()
+            cursor.close()
+        archive.writestr("manifest.csv", manifest.getvalue())
+    yield sink.drain()
+
+def _write_patient(archive, sink, writer, patient, futures, error):
+    folder = patient["patient_id"]
+    written = 0
+    for filename, future in futures:
+        try:
+            pdf = future.result(timeout=PDF_RENDER_TIMEOUT)
+        except Exception as e:
+            error = error or f"{filename}: {e}"
+            continue
+        archive.writestr(f"{folder}/{filename}", pdf)
+        written += 1
+        yield sink.drain()
+    writer.writerow([
+        patient["patient_id"], patient.get("name"), patient.get("status"), patient.get("admission_date"),
+        (patient.get("bill") or {}).get("discharge_date"), written, error or ""
+    ])
@@ -0,0 +1,153 @@
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from fingerprints import compute_fingerprint
+from pdf_service import PDF_TEMPLATE_VERSION, render_pdf, submit_pdf
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".pdf_cache"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+def document_key(kind, *args):
+    """Content address of a document: its inputs plus the template version"""
+    return compute_fingerprint(kind, PDF_TEMPLATE_VERSION, args)
+
+def document_etag(key):
+    return f'"pdf-{key[:32]}"'
+
+class PDFCache:
+    """
+    Rendered PDFs on local disk, one file per content key, evicted least
+    recently used first once the directory exceeds max_bytes. Recency lives in
+    memory and is rebuilt from file mtimes at startup.
+    """
+
+    def __init__(self, directory=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+        self._size = 0
+        self._loaded = False
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _load(self):
+        # Called with the lock held
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        self._loaded = True
+
+    def get(self, key):
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            # Removed behind our back: forget it and render again
+            with self._lock:
+                self._size -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        # Keep mtime in step with recency so the order survives a restart
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._load()
+        # Write to a private temp file and rename so readers never see a partial PDF
+        tmp_path = os.path.join(self.directory, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._size > self.max_bytes and self._entries:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "documents": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None
+            }
+
+pdf_cache = PDFCache()
+
+def get_or_render(kind, *args):
+    """(key, pdf bytes), rendering on the PDF pool only on a cache miss"""
+    key = document_key(kind, *args)
+    data = pdf_cache.get(key)
+    if data is None:
+        data = render_pdf(kind, *args)
+        try:
+            pdf_cache.put(key, data)
+        except OSError as e:
+            print(f"⚠️ Could not cache rendered PDF: {e}")
+    return key, data
+
+def submit_cached(kind, *args) -> Future:
+    """
+    Future resolving to the PDF bytes: already resolved on a cache hit,
+    otherwise rendering on the pool and stored in the cache once done.
+    """
+    key = document_key(kind, *args)
+    data = pdf_cache.get(key)
+    if data is not None:
+        future = Future()
+        future.set_result(data)
+        return future
+    
+    def store(done):
+        # A cancelled render (an export that gave up on the patient) has nothing to store
+        if not done.cancelled() and done.exception() is None:
+            try:
+                pdf_cache.put(key, done.result())
+            except OSError as e:
+                print(f"⚠️ Could not cache rendered PDF: {e}")
+    
+    future = submit_pdf(kind, *args)
+    future.add_done_callback(store)
+    return future
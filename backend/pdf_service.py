@@ -0,0 +1,103 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import pdf_templates
+
+# ReportLab layout is CPU-bound and holds the GIL, so documents are rendered
+# in worker processes. PDF_WORKERS=0 renders inline on the calling thread.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Renders queued or running at once; callers beyond this wait up to PDF_QUEUE_TIMEOUT
+PDF_QUEUE_SIZE = int(os.getenv("PDF_QUEUE_SIZE", str(max(PDF_WORKERS, 1) * 4)))
+PDF_QUEUE_TIMEOUT = float(os.getenv("PDF_QUEUE_TIMEOUT", "10"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "30"))
+
+# Bump whenever a builder's layout changes so cached renders are not reused
+PDF_TEMPLATE_VERSION = "1"
+
+class PdfQueueFull(Exception):
+    """Raised when the render queue stays full for PDF_QUEUE_TIMEOUT seconds"""
+
+# Patient fields the builders read; only these are shipped to the workers and
+# hashed into cache keys, so unrelated patient updates do not invalidate renders
+DOCUMENT_PATIENT_FIELDS = ("patient_id", "name", "age", "diagnosis", "admission_date")
+
+def document_patient(patient):
+    return {field: patient.get(field) for field in DOCUMENT_PATIENT_FIELDS}
+
+# Plain data in, PDF bytes out: these run inside the worker processes
+BUILDERS = {
+    "prescription": pdf_templates.build_prescription,
+    "summary": pdf_templates.build_summary,
+    "bill": pdf_templates.build_bill,
+    "discharge": pdf_templates.build_discharge_packet
+}
+
+def _build(kind, args):
+    return BUILDERS[kind](*args)
+
+def _warm_worker():
+    # Styles are built at import; one tiny render also loads the fonts
+    pdf_templates.build_summary({"name": "", "patient_id": "", "diagnosis": ""}, "")
+
+# ==================== RENDER POOL ====================
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PDF_QUEUE_SIZE)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: never fork a process that holds Mongo/HTTP client threads
+                _pool = ProcessPoolExecutor(
+                    max_workers=PDF_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker
+                )
+    return _pool
+
+def submit_pdf(kind, *args) -> Future:
+    """
+    Queue a render and return a Future resolving to the PDF bytes. Blocks while
+    PDF_QUEUE_SIZE renders are in flight; raises PdfQueueFull after PDF_QUEUE_TIMEOUT.
+    """
+    if kind not in BUILDERS:
+        raise ValueError(f"unknown document kind '{kind}'")
+    if not _slots.acquire(timeout=PDF_QUEUE_TIMEOUT):
+        raise PdfQueueFull(f"PDF render queue full ({PDF_QUEUE_SIZE} in flight)")
+    
+    if PDF_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(_build(kind, args))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            _slots.release()
+        return future
+    
+    try:
+        future = _get_pool().submit(_build, kind, args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+def render_pdf(kind, *args) -> bytes:
+    """Render a document on the pool and wait for its bytes"""
+    return submit_pdf(kind, *args).result(timeout=PDF_RENDER_TIMEOUT)
+
+def shutdown_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown_pdf_pool)
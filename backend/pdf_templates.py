@@ -0,0 +1,248 @@
+"""
+Document templates for every PDF the backend produces. Stylesheets, paragraph
+styles, table styles and page geometry are built once per process at import;
+each render only creates the flowables for its own content.
+"""
+from io import BytesIO
+from typing import Any, Dict, List
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+HOSPITAL_NAME = "St. Jude's Medical Center"
+
+# ==================== STYLES ====================
+
+_SAMPLE = getSampleStyleSheet()
+NORMAL = _SAMPLE['Normal']
+HEADING2 = _SAMPLE['Heading2']
+
+# Single-document downloads: plain layout, one accent colour per document
+SUMMARY_TITLE = ParagraphStyle('Title', parent=_SAMPLE['Title'], fontSize=20, textColor=colors.HexColor('#2563eb'))
+PRESCRIPTION_TITLE = ParagraphStyle('Title', parent=_SAMPLE['Title'], fontSize=20, textColor=colors.HexColor('#f59e0b'))
+INVOICE_TITLE = ParagraphStyle('Title', parent=_SAMPLE['Title'], fontSize=20, textColor=colors.HexColor('#dc2626'))
+
+INVOICE_TABLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#fee2e2')),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+# Discharge packet sent to the guardian
+PACKET_TITLE = ParagraphStyle(
+    'CustomTitle',
+    parent=_SAMPLE['Heading1'],
+    fontSize=18,
+    textColor=colors.HexColor('#1a1a1a'),
+    spaceAfter=5,
+    alignment=TA_CENTER,
+    fontName='Helvetica-Bold'
+)
+PACKET_SUBTITLE = ParagraphStyle(
+    'Subtitle',
+    parent=NORMAL,
+    fontSize=10,
+    textColor=colors.HexColor('#666666'),
+    spaceAfter=20,
+    alignment=TA_CENTER
+)
+PACKET_HEADING = ParagraphStyle(
+    'CustomHeading',
+    parent=HEADING2,
+    fontSize=13,
+    textColor=colors.HexColor('#1a1a1a'),
+    spaceAfter=10,
+    spaceBefore=15,
+    fontName='Helvetica-Bold'
+)
+PACKET_BODY = ParagraphStyle(
+    'BodyText',
+    parent=NORMAL,
+    fontSize=10,
+    textColor=colors.HexColor('#333333'),
+    leading=14,
+    alignment=TA_JUSTIFY
+)
+PACKET_FOOTER = ParagraphStyle(
+    'Footer',
+    parent=NORMAL,
+    fontSize=8,
+    textColor=colors.HexColor('#666666'),
+    alignment=TA_CENTER
+)
+
+PACKET_RULE_TABLE = TableStyle([('LINEABOVE', (0, 0), (-1, 0), 1, colors.HexColor('#cccccc'))])
+PACKET_PATIENT_TABLE = TableStyle([
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#333333')),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+])
+PACKET_BILL_TABLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#333333')),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('FONTSIZE', (0, 1), (-1, -2), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('LINEBELOW', (0, -3), (-1, -3), 1, colors.HexColor('#cccccc')),
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, -1), (-1, -1), 11),
+    ('LINEABOVE', (0, -1), (-1, -1), 1.5, colors.HexColor('#333333')),
+])
+
+# ==================== PAGE TEMPLATES ====================
+# ReportLab page templates keep per-build frame state, so each render gets its
+# own document; only the geometry is shared.
+
+PAGE_DEFAULT = {"pagesize": A4}
+PAGE_PACKET = {"pagesize": A4, "rightMargin": 50, "leftMargin": 50, "topMargin": 40, "bottomMargin": 40}
+
+def _render(story: List[Any], page: Dict[str, Any] = PAGE_DEFAULT) -> bytes:
+    buffer = BytesIO()
+    SimpleDocTemplate(buffer, **page).build(story)
+    return buffer.getvalue()
+
+def _text_block(text: str, style: ParagraphStyle, gap: float = 0) -> List[Any]:
+    """One paragraph per non-blank line, optionally followed by a spacer"""
+    block = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if line:
+            block.append(Paragraph(line, style))
+            if gap:
+                block.append(Spacer(1, gap))
+    return block
+
+def _money(amount) -> str:
+    return f"{amount:,.2f}"
+
+def _gst(breakdown: Dict[str, Any]):
+    """(label, amount) for the tax line; bills stored before gst_rate was recorded were 18%"""
+    if "gst_amount" in breakdown:
+        rate, amount = breakdown.get("gst_rate", 0.18), breakdown["gst_amount"]
+    else:
+        rate, amount = 0.18, breakdown.get("gst_18_percent", 0)
+    return f"GST ({rate * 100:g}%)", amount
+
+# ==================== DOCUMENTS ====================
+
+def build_summary(patient: Dict[str, Any], summary: str) -> bytes:
+    """Discharge summary download"""
+    story = [
+        Paragraph(f"Discharge Summary - {patient['name']}", SUMMARY_TITLE),
+        Spacer(1, 0.3*inch),
+        Paragraph(f"<b>Patient ID:</b> {patient['patient_id']}", NORMAL),
+        Paragraph(f"<b>Diagnosis:</b> {patient['diagnosis']}", NORMAL),
+        Spacer(1, 0.2*inch),
+    ]
+    story += _text_block(summary, NORMAL)
+    return _render(story)
+
+def build_prescription(patient: Dict[str, Any], prescription: str, issued_on: str) -> bytes:
+    """Prescription download"""
+    story = [
+        Paragraph(f"Prescription - {patient['name']}", PRESCRIPTION_TITLE),
+        Spacer(1, 0.3*inch),
+        Paragraph(f"<b>Patient ID:</b> {patient['patient_id']}", NORMAL),
+        Paragraph(f"<b>Date:</b> {issued_on}", NORMAL),
+        Spacer(1, 0.2*inch),
+    ]
+    story += _text_block(prescription, NORMAL)
+    return _render(story)
+
+def build_bill(patient: Dict[str, Any], bill: Dict[str, Any]) -> bytes:
+    """Itemised invoice download"""
+    breakdown = bill['breakdown']
+    symbol = bill.get('currency_symbol', '₹')
+    gst_label, gst_amount = _gst(breakdown)
+    info_table = Table([
+        ["Patient Name:", patient['name']],
+        ["Patient ID:", patient['patient_id']],
+        ["Admission Date:", bill['admission_date']],
+        ["Discharge Date:", bill['discharge_date']],
+        ["Days Stayed:", f"{bill['days_stayed']} days"]
+    ])
+    bill_table = Table([
+        ["Description", f"Amount ({symbol})"],
+        ["Room Charges", f"{symbol}{_money(breakdown['room_charges'])}"],
+        ["Doctor Charges", f"{symbol}{_money(breakdown['doctor_charges'])}"],
+        ["Nursing Charges", f"{symbol}{_money(breakdown.get('nursing_charges', 0))}"],
+        ["Prescription Cost", f"{symbol}{_money(breakdown['prescription_cost'])}"],
+        ["Additional Charges", f"{symbol}{_money(breakdown.get('additional_charges', 0))}"],
+        ["Subtotal", f"{symbol}{_money(breakdown.get('subtotal', 0))}"],
+        [gst_label, f"{symbol}{_money(gst_amount)}"],
+        ["TOTAL AMOUNT", f"{symbol}{_money(bill['total_amount'])}"]
+    ], colWidths=[4*inch, 2*inch], style=INVOICE_TABLE)
+    return _render([
+        Paragraph("INVOICE", INVOICE_TITLE),
+        Paragraph(HOSPITAL_NAME, HEADING2),
+        Spacer(1, 0.3*inch),
+        info_table,
+        Spacer(1, 0.3*inch),
+        bill_table,
+    ])
+
+def build_discharge_packet(patient: Dict[str, Any], summary: str, prescription: str, bill: Dict[str, Any]) -> bytes:
+    """Combined summary, prescription and bill sent to the guardian"""
+    breakdown = bill['breakdown']
+    gst_label, gst_amount = _gst(breakdown)
+    story = [
+        # Hospital header
+        Paragraph("ST. JUDE'S MEDICAL CENTER", PACKET_TITLE),
+        Paragraph("123 Medical Plaza, Healthcare District, Mumbai - 400001", PACKET_SUBTITLE),
+        Paragraph("Phone: +91-22-2345-6789 | Email: info@stjudes.com | www.stjudes.com", PACKET_SUBTITLE),
+        Spacer(1, 0.1*inch),
+        Table([['']], colWidths=[7*inch], style=PACKET_RULE_TABLE),
+        Spacer(1, 0.2*inch),
+        Paragraph("DISCHARGE SUMMARY", PACKET_HEADING),
+        Spacer(1, 0.1*inch),
+        Table([
+            ['Patient Name:', patient['name'], 'Patient ID:', patient['patient_id']],
+            ['Age:', f"{patient['age']} years", 'Gender:', 'Male'],
+            ['Diagnosis:', patient['diagnosis'], '', ''],
+            ['Admission Date:', patient['admission_date'], 'Discharge Date:', bill['discharge_date']],
+        ], colWidths=[1.3*inch, 2*inch, 1.3*inch, 2*inch], style=PACKET_PATIENT_TABLE),
+        Spacer(1, 0.2*inch),
+        Paragraph("CLINICAL SUMMARY", PACKET_HEADING),
+    ]
+    story += _text_block(summary, PACKET_BODY, gap=0.05*inch)
+    story += [Spacer(1, 0.1*inch), Paragraph("PRESCRIPTION", PACKET_HEADING)]
+    story += _text_block(prescription, PACKET_BODY, gap=0.05*inch)
+    story += [Spacer(1, 0.2*inch), Paragraph("FINANCIAL SUMMARY", PACKET_HEADING)]
+
+    bill_data = [
+        ['DESCRIPTION', f"AMOUNT ({bill.get('currency_symbol', '₹')})"],
+        ['Room Charges', _money(breakdown['room_charges'])],
+        ['Doctor Consultation', _money(breakdown['doctor_charges'])],
+        ['Nursing Care', _money(breakdown.get('nursing_charges', 0))],
+        ['Pharmacy & Medications', _money(breakdown['prescription_cost'])],
+    ]
+    if breakdown.get('additional_charges', 0) > 0:
+        bill_data.append(['Medical Procedures & Diagnostics', _money(breakdown['additional_charges'])])
+    bill_data += [
+        ['Subtotal', _money(breakdown.get('subtotal', 0))],
+        [gst_label.upper(), _money(gst_amount)],
+        ['TOTAL PAYABLE', _money(bill['total_amount'])],
+    ]
+    story += [
+        Table(bill_data, colWidths=[5*inch, 2*inch], style=PACKET_BILL_TABLE),
+        Spacer(1, 0.3*inch),
+        # Footer
+        Spacer(1, 0.2*inch),
+        Paragraph("This is a computer-generated document. For any queries, please contact our billing department.", PACKET_FOOTER),
+        Paragraph("Payment is due within 7 days. We accept cash, card, and online transfers.", PACKET_FOOTER),
+        Spacer(1, 0.1*inch),
+        Paragraph(f"Thank you for choosing {HOSPITAL_NAME} for your healthcare needs.", PACKET_FOOTER),
+    ]
+    return _render(story, PAGE_PACKET)
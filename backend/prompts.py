@@ -0,0 +1,50 @@
+import string
+
+_formatter = string.Formatter()
+
+_registry = {}
+
+class CompiledPrompt:
+    """
+    A prompt template parsed and validated once. render() is a plain
+    str.format_map, with none of PromptTemplate's per-call construction cost.
+    """
+    
+    __slots__ = ("name", "template", "variables")
+    
+    def __init__(self, name, template, variables):
+        placeholders = {field for _, field, _, _ in _formatter.parse(template) if field is not None}
+        
+        unnamed = [field for field in placeholders if not field.isidentifier()]
+        if unnamed:
+            raise ValueError(f"Prompt '{name}' has non-identifier placeholders: {sorted(unnamed)}")
+        missing = placeholders - set(variables)
+        if missing:
+            raise ValueError(f"Prompt '{name}' uses undeclared variables: {sorted(missing)}")
+        unused = set(variables) - placeholders
+        if unused:
+            raise ValueError(f"Prompt '{name}' declares variables it never uses: {sorted(unused)}")
+        
+        self.name = name
+        self.template = template
+        self.variables = tuple(variables)
+    
+    def render(self, **values) -> str:
+        missing = [variable for variable in self.variables if variable not in values]
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' missing values for: {missing}")
+        return self.template.format_map(values)
+
+def register_prompt(name, template, variables) -> CompiledPrompt:
+    """Compile and validate a template once; registering the same name twice is an error"""
+    if name in _registry:
+        raise ValueError(f"Prompt '{name}' is already registered")
+    prompt = CompiledPrompt(name, template, variables)
+    _registry[name] = prompt
+    return prompt
+
+def get_prompt(name) -> CompiledPrompt:
+    return _registry[name]
+
+def render_prompt(name, **values) -> str:
+    return _registry[name].render(**values)
@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from detection_jobs import DETECTION_LEASE, DETECTION_LEASE_SECONDS, create_job, run_job
+from leases import held_lease
+
+# 0 disables the periodic run; bursts of vital-sign updates can still trigger one
+DETECTION_INTERVAL_SECONDS = int(os.getenv("DETECTION_INTERVAL_SECONDS", "0"))
+# A run is triggered early once this many vital-sign updates land within the window (0 disables)
+DETECTION_BURST_THRESHOLD = int(os.getenv("DETECTION_BURST_THRESHOLD", "10"))
+DETECTION_BURST_WINDOW_SECONDS = int(os.getenv("DETECTION_BURST_WINDOW_SECONDS", "60"))
+# Burst-triggered runs are not started closer together than this
+DETECTION_MIN_GAP_SECONDS = int(os.getenv("DETECTION_MIN_GAP_SECONDS", "30"))
+
+class DetectionScheduler:
+    """
+    Background thread that runs discharge detection on a cadence and on
+    bursts of vital-sign updates. Every worker may run one; the MongoDB lease
+    makes sure only one of them actually executes a given run.
+    """
+    
+    def __init__(self, interval_seconds=DETECTION_INTERVAL_SECONDS, burst_threshold=DETECTION_BURST_THRESHOLD,
+                 burst_window_seconds=DETECTION_BURST_WINDOW_SECONDS, min_gap_seconds=DETECTION_MIN_GAP_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.burst_threshold = burst_threshold
+        self.burst_window_seconds = burst_window_seconds
+        self.min_gap_seconds = min_gap_seconds
+        self._updates = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_job_id = None
+        self.last_trigger = None
+    
+    @property
+    def enabled(self):
+        return self.interval_seconds > 0 or self.burst_threshold > 0
+    
+    def start(self):
+        if not self.enabled or self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="detection-scheduler", daemon=True)
+        self._thread.start()
+        print(f"⏰ Detection scheduler started (interval: {self.interval_seconds}s, burst: {self.burst_threshold}/{self.burst_window_seconds}s)")
+    
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def notify_vitals_update(self):
+        """Record a vital-sign update; wakes the scheduler when a burst threshold is crossed"""
+        if self.burst_threshold <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._updates.append(now)
+            while self._updates and now - self._updates[0] > self.burst_window_seconds:
+                self._updates.popleft()
+            burst = len(self._updates) >= self.burst_threshold
+            if burst:
+                self._updates.clear()
+        if burst:
+            self._wake.set()
+    
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "interval_seconds": self.interval_seconds,
+            "burst_threshold": self.burst_threshold,
+            "burst_window_seconds": self.burst_window_seconds,
+            "last_run": self.last_run,
+            "last_trigger": self.last_trigger,
+            "last_job_id": self.last_job_id
+        }
+    
+    def _loop(self):
+        last_started = None
+        next_run = time.monotonic() + self.interval_seconds if self.interval_seconds > 0 else None
+        # A burst that lands within min_gap of the last run is deferred, not dropped:
+        # notify_vitals_update has already cleared the updates that triggered it
+        burst_pending = False
+        
+        while not self._stop.is_set():
+            deadlines = [next_run] if next_run is not None else []
+            if burst_pending:
+                deadlines.append(last_started + self.min_gap_seconds)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            if self._wake.wait(timeout):
+                burst_pending = True
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            
+            now = time.monotonic()
+            burst_due = burst_pending and (last_started is None or now - last_started >= self.min_gap_seconds)
+            interval_due = next_run is not None and now >= next_run
+            if not (burst_due or interval_due):
+                continue
+            
+            # Either kind of run re-evaluates the patients behind a pending burst
+            burst_pending = False
+            last_started = now
+            self.run_once("vitals_burst" if burst_due else "interval")
+            if self.interval_seconds > 0:
+                next_run = time.monotonic() + self.interval_seconds
+    
+    def run_once(self, trigger):
+        """Run detection now if no other worker is; returns the job id or None"""
+        try:
+            with held_lease(DETECTION_LEASE, DETECTION_LEASE_SECONDS) as acquired:
+                if not acquired:
+                    print(f"⏭️ Scheduled detection ({trigger}) skipped: another run holds the lease")
+                    return None
+                job_id = create_job({"trigger": trigger})
+                self.last_run = datetime.utcnow()
+                self.last_trigger = trigger
+                self.last_job_id = job_id
+                run_job(job_id, lease_held=True)
+                return job_id
+        except Exception as e:
+            print(f"❌ Scheduled detection failed: {e}")
+            return None
+
+detection_scheduler = DetectionScheduler()
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Connections open at once (sends beyond this wait up to SMTP_TIMEOUT for one)
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+# Idle connections older than this are closed instead of reused; keep it under
+# the server's own idle cutoff so we rarely pick up a dead socket
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# Gmail and most relays cap messages per session; reconnect before hitting it
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "90"))
+
+class SMTPPoolTimeout(Exception):
+    """Raised when no connection frees up within the pool timeout"""
+
+def _is_connection_error(e):
+    # SMTPException subclasses OSError, so protocol errors are ruled out first
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code == 421
+    if isinstance(e, smtplib.SMTPException):
+        return False
+    return isinstance(e, OSError)
+
+class _Connection:
+    __slots__ = ("smtp", "messages", "last_used", "reused")
+
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages = 0
+        self.last_used = time.monotonic()
+        self.reused = False
+
+class SMTPPool:
+    """
+    Authenticated SMTP connections kept open between sends. A connection that
+    fails mid-send after sitting idle is replaced and the message retried once;
+    protocol errors (refused recipient, rejected data) are raised as usual.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True,
+                 size=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT, timeout=SMTP_TIMEOUT,
+                 max_messages=SMTP_MAX_MESSAGES_PER_CONNECTION):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self.opened = 0
+        self.reused = 0
+        self.reconnects = 0
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._idle = []  # least recently used first
+        self._slots = threading.BoundedSemaphore(size)
+        self._executor = None
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            # Local relays and test sinks take mail without authentication
+            if self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        with self._lock:
+            self.opened += 1
+        return _Connection(smtp)
+
+    def _close(self, conn, polite=True):
+        try:
+            if polite:
+                conn.smtp.quit()
+            else:
+                conn.smtp.close()
+        except Exception:
+            conn.smtp.close()
+
+    def _checkout(self):
+        expired = []
+        conn = None
+        with self._lock:
+            now = time.monotonic()
+            while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+                expired.append(self._idle.pop(0))
+            if self._idle:
+                conn = self._idle.pop()
+                conn.reused = True
+                self.reused += 1
+        for old in expired:
+            self._close(old)
+        return conn or self._connect()
+
+    def _checkin(self, conn):
+        if conn.messages >= self.max_messages:
+            self._close(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+
+    def _send_on(self, conn, msg):
+        try:
+            conn.smtp.send_message(msg)
+        except Exception as e:
+            if _is_connection_error(e):
+                self._close(conn, polite=False)
+            else:
+                # smtplib has already reset the transaction; the session is still good
+                self._checkin(conn)
+            raise
+        conn.messages += 1
+        self._checkin(conn)
+        with self._lock:
+            self.sent += 1
+
+    def send(self, msg):
+        """Send an email.message.Message on a pooled connection"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise SMTPPoolTimeout(f"no SMTP connection free within {self.timeout}s ({self.size} in use)")
+        try:
+            conn = self._checkout()
+            try:
+                self._send_on(conn, msg)
+            except Exception as e:
+                if not (conn.reused and _is_connection_error(e)):
+                    raise
+                # The server dropped the idle connection: one retry on a fresh one
+                with self._lock:
+                    self.reconnects += 1
+                self._send_on(self._connect(), msg)
+        finally:
+            self._slots.release()
+
+    async def send_async(self, msg):
+        """
+        send() for asyncio callers. smtplib is blocking, so the exchange runs on
+        a thread per pool slot and the event loop only awaits the result.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="smtp")
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.send, msg)
+
+    def close(self):
+        """Quit every idle connection; in-flight sends finish on their own"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            executor, self._executor = self._executor, None
+        for conn in idle:
+            self._close(conn)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "opened": self.opened,
+                "reused": self.reused,
+                "reconnects": self.reconnects,
+                "sent": self.sent
+            }
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
+
+from diagnosis_taxonomy import CATEGORIES, GENERAL
+
+TARIFF_FILE = os.getenv("TARIFF_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tariffs.json"))
+# Seconds between mtime checks of the tariff file
+TARIFF_RELOAD_INTERVAL = float(os.getenv("TARIFF_RELOAD_INTERVAL", "5"))
+
+WARD_FIELDS = ("room_per_day", "nursing_per_day", "doctor_consultation")
+CATEGORY_FIELDS = ("package_cost", "prescription_cost", "items")
+
+class Tariff(NamedTuple):
+    room_per_day: int
+    nursing_per_day: int
+    doctor_consultation: int
+    prescription_cost: int
+    package_cost: int
+    items: Tuple[str, ...]
+
+class TariffTable:
+    """
+    One immutable version of the tariff file, indexed by (category, ward).
+    Every category is priced in every ward; `overrides` entries replace
+    individual fields for one (category, ward) pair.
+    """
+
+    def __init__(self, data: Dict):
+        self.version = str(data["version"])
+        self.currency = data.get("currency", "INR")
+        self.currency_symbol = data.get("currency_symbol", "₹")
+        self.gst_rate = float(data["gst_rate"])
+        self.default_ward = data.get("default_ward", "general")
+
+        wards, categories = data["wards"], data["categories"]
+        if self.default_ward not in wards:
+            raise ValueError(f"default_ward '{self.default_ward}' has no tariff")
+        if GENERAL not in categories:
+            raise ValueError(f"category '{GENERAL}' has no tariff")
+        unknown = set(categories) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"unknown diagnosis categories: {', '.join(sorted(unknown))}")
+
+        fields = {}
+        for ward, ward_prices in wards.items():
+            for category, category_prices in categories.items():
+                fields[(category, ward)] = {
+                    **{field: ward_prices[field] for field in WARD_FIELDS},
+                    **{field: category_prices[field] for field in CATEGORY_FIELDS}
+                }
+        for override in data.get("overrides", []):
+            key = (override["category"], override["ward"])
+            if key not in fields:
+                raise ValueError(f"override for unknown category/ward {key}")
+            fields[key].update({k: v for k, v in override.items() if k in WARD_FIELDS + CATEGORY_FIELDS})
+
+        self.index = {
+            key: Tariff(**{**values, "items": tuple(values["items"])})
+            for key, values in fields.items()
+        }
+
+        # Column view for batch billing: row i prices self.keys[i]
+        self.keys = list(self.index)
+        self.rows = {key: i for i, key in enumerate(self.keys)}
+        self.columns = {
+            field: np.array([getattr(self.index[key], field) for key in self.keys], dtype=np.int64)
+            for field in ("room_per_day", "nursing_per_day", "doctor_consultation", "prescription_cost", "package_cost")
+        }
+
+    def resolve(self, category, ward=None) -> Tuple[str, str]:
+        """(category, ward) key that prices this patient; unknown values fall back to defaults"""
+        ward = ward if (GENERAL, ward) in self.index else self.default_ward
+        category = category if (category, ward) in self.index else GENERAL
+        return category, ward
+
+    def lookup(self, category, ward=None) -> Tariff:
+        return self.index[self.resolve(category, ward)]
+
+    def row(self, category, ward=None) -> int:
+        return self.rows[self.resolve(category, ward)]
+
+_lock = threading.Lock()
+_table = None
+_loaded_mtime = None
+_next_check = 0.0
+
+def load_tariff_table(path=None) -> TariffTable:
+    with open(path or TARIFF_FILE, encoding="utf-8") as f:
+        return TariffTable(json.load(f))
+
+def get_tariffs() -> TariffTable:
+    """
+    Current tariff table. The file's mtime is checked at most every
+    TARIFF_RELOAD_INTERVAL seconds; a changed file is parsed into a new table
+    and swapped in whole, so callers never see a half-loaded version. A bad
+    edit keeps the previous table in service.
+    """
+    global _table, _loaded_mtime, _next_check
+
+    if _table is not None and time.monotonic() < _next_check:
+        return _table
+
+    with _lock:
+        if _table is not None and time.monotonic() < _next_check:
+            return _table
+        _next_check = time.monotonic() + TARIFF_RELOAD_INTERVAL
+
+        try:
+            mtime = os.stat(TARIFF_FILE).st_mtime_ns
+        except OSError as e:
+            if _table is None:
+                raise
+            print(f"⚠️ Tariff file unavailable, keeping version {_table.version}: {e}")
+            return _table
+
+        if mtime != _loaded_mtime:
+            try:
+                table = load_tariff_table()
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                if _table is None:
+                    raise
+                print(f"⚠️ Tariff reload failed, keeping version {_table.version}: {e}")
+            else:
+                if _table is not None:
+                    print(f"💱 Tariffs reloaded: version {_table.version} -> {table.version}")
+                _table, _loaded_mtime = table, mtime
+        return _table
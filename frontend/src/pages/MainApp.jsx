@@ -7,6 +7,7 @@ const API_BASE_URL = 'http://localhost:8000';
 const apiService = {
   getPatients: () => fetch(`${API_BASE_URL}/api/patients`).then(r => r.json()),
   runDischargeDetection: () => fetch(`${API_BASE_URL}/api/run-discharge-detection`, { method: 'POST' }).then(r => r.json()),
+  detectionJobEvents: (jobId) => new EventSource(`${API_BASE_URL}/api/detection-jobs/${jobId}/events`),
   approvePatient: (patientId) => fetch(`${API_BASE_URL}/api/patients/${patientId}/approve`, { method: 'POST' }).then(r => r.json()),
   getNurseTasks: (patientId) => fetch(`${API_BASE_URL}/api/nurse-tasks/${patientId}`).then(r => r.json()),
   updateNurseTasks: (patientId, data) => fetch(`${API_BASE_URL}/api/nurse-tasks/${patientId}/update`, {
@@ -175,7 +176,25 @@ const DoctorPortal = () => {
   const handleRunDetection = async () => {
     setLoading(true);
     try {
-      await apiService.runDischargeDetection();
+      const job = await apiService.runDischargeDetection();
+      // Mark patients ready as each result streams in, then reload once the job finishes
+      await new Promise((resolve) => {
+        const events = apiService.detectionJobEvents(job.job_id);
+        events.addEventListener('result', (e) => {
+          const result = JSON.parse(e.data);
+          if (result.decision === 'READY') {
+            setPatients(prev => prev.map(p => p.patient_id === result.patient_id ? { ...p, ready_for_discharge: true } : p));
+          }
+        });
+        events.addEventListener('done', () => {
+          events.close();
+          resolve();
+        });
+        events.onerror = () => {
+          events.close();
+          resolve();
+        };
+      });
       await fetchPatients();
     } catch (error) {
       console.error('Error:', error);
@@ -188,7 +207,7 @@ const DoctorPortal = () => {
       await apiService.approvePatient(selectedPatient.patient_id);
       await fetchPatients();
       setSelectedPatient(null);
-      alert('Patient approved! Nurse has been notified via email.');
+      alert('Patient approved! Nurse will be notified via email.');
     } catch (error) {
       console.error('Error:', error);
     }
@@ -792,7 +811,7 @@ const BillingPortal = () => {
     try {
       const response = await apiService.sendToGuardian(selectedPatient.patient_id);
       if (response.success) {
-        alert(`Discharge documents sent successfully to ${selectedPatient.guardian_email}!`);
+        alert(`Discharge documents queued for delivery to ${selectedPatient.guardian_email}!`);
         await fetchPatients();
         setSelectedPatient(null);
       }
@@ -873,38 +892,38 @@ const BillingPortal = () => {
                         <div className="space-y-2">
                           <div className="flex justify-between">
                             <span>Room Charges:</span>
-                            <span className="font-semibold">₹{bill.breakdown.room_charges.toLocaleString('en-IN')}</span>
+                            <span className="font-semibold">{bill.currency_symbol || '₹'}{bill.breakdown.room_charges.toLocaleString('en-IN')}</span>
                           </div>
                           <div className="flex justify-between">
                             <span>Doctor Charges:</span>
-                            <span className="font-semibold">₹{bill.breakdown.doctor_charges.toLocaleString('en-IN')}</span>
+                            <span className="font-semibold">{bill.currency_symbol || '₹'}{bill.breakdown.doctor_charges.toLocaleString('en-IN')}</span>
                           </div>
                           {bill.breakdown.nursing_charges && (
                             <div className="flex justify-between">
                               <span>Nursing Charges:</span>
-                              <span className="font-semibold">₹{bill.breakdown.nursing_charges.toLocaleString('en-IN')}</span>
+                              <span className="font-semibold">{bill.currency_symbol || '₹'}{bill.breakdown.nursing_charges.toLocaleString('en-IN')}</span>
                             </div>
                           )}
                           <div className="flex justify-between">
                             <span>Prescription Cost:</span>
-                            <span className="font-semibold">₹{bill.breakdown.prescription_cost.toLocaleString('en-IN')}</span>
+                            <span className="font-semibold">{bill.currency_symbol || '₹'}{bill.breakdown.prescription_cost.toLocaleString('en-IN')}</span>
                           </div>
                           {bill.breakdown.additional_charges > 0 && (
                             <div className="flex justify-between">
                               <span>Additional Charges:</span>
-                              <span className="font-semibold">₹{bill.breakdown.additional_charges.toLocaleString('en-IN')}</span>
+                              <span className="font-semibold">{bill.currency_symbol || '₹'}{bill.breakdown.additional_charges.toLocaleString('en-IN')}</span>
                             </div>
                           )}
                           {bill.breakdown.subtotal && (
                             <div className="flex justify-between border-t pt-2">
                               <span>Subtotal:</span>
-                              <span className="font-semibold">₹{bill.breakdown.subtotal.toLocaleString('en-IN')}</span>
+                              <span className="font-semibold">{bill.currency_symbol || '₹'}{bill.breakdown.subtotal.toLocaleString('en-IN')}</span>
                             </div>
                           )}
-                          {bill.breakdown.gst_18_percent && (
+                          {(bill.breakdown.gst_amount ?? bill.breakdown.gst_18_percent) && (
                             <div className="flex justify-between">
-                              <span>GST (18%):</span>
-                              <span className="font-semibold">₹{bill.breakdown.gst_18_percent.toLocaleString('en-IN')}</span>
+                              <span>GST ({((bill.breakdown.gst_rate ?? 0.18) * 100).toLocaleString('en-IN')}%):</span>
+                              <span className="font-semibold">{bill.currency_symbol || '₹'}{(bill.breakdown.gst_amount ?? bill.breakdown.gst_18_percent).toLocaleString('en-IN')}</span>
                             </div>
                           )}
                         </div>
@@ -912,7 +931,7 @@ const BillingPortal = () => {
                       <div className="border-t pt-3 mt-3">
                         <div className="flex justify-between text-xl">
                           <span className="font-bold">TOTAL AMOUNT:</span>
-                          <span className="font-bold text-red-600">₹{bill.total_amount.toLocaleString('en-IN')}</span>
+                          <span className="font-bold text-red-600">{bill.currency_symbol || '₹'}{bill.total_amount.toLocaleString('en-IN')}</span>
                         </div>
                       </div>
                     </div>